@@ -0,0 +1,77 @@
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator, Dict, Optional, Tuple
+
+# (line number, parsed row or None, error message or None)
+ParsedRow = Tuple[int, Optional[Dict], Optional[str]]
+
+_NOT_UTF8 = "Line is not valid UTF-8"
+
+
+def _decode(raw: bytes, line_no: int) -> Optional[str]:
+    try:
+        return raw.decode("utf-8-sig" if line_no == 1 else "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """
+    Split a byte stream into numbered, decoded lines as it arrives. Lines
+    that aren't valid UTF-8 come out as None.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            yield line_no, _decode(raw, line_no)
+    if buffer:
+        line_no += 1
+        yield line_no, _decode(buffer, line_no)
+
+
+async def parse_jsonl(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    """One JSON object per line; blank lines are skipped."""
+    async for line_no, line in iter_lines(chunks):
+        if line is None:
+            yield line_no, None, _NOT_UTF8
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+async def parse_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    """
+    CSV with a header row naming CandidateInfo fields. Quoted fields may
+    contain commas but not newlines, since rows are parsed line by line.
+    Empty cells are treated as missing.
+    """
+    header = None
+    async for line_no, line in iter_lines(chunks):
+        if line is None:
+            yield line_no, None, _NOT_UTF8
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_no, {k: v for k, v in zip(header, values) if v != ""}, None
@@ -1,9 +1,44 @@
 # corsi_engine.py
-from datetime import datetime
-from typing import List, Dict
+from array import array
+from typing import List, Dict, Optional, Tuple
+import json
 import random
+import struct
+import time
+import uuid
 
-from database_manager import DatabaseManager
+from database_manager import DatabaseManager, now_ms
+from trial_log import TrialLog
+from write_behind import WriteBehindQueue
+
+# to_bytes() layout: header, one _TALLY per span, candidate JSON, taps of
+# the pending sequence, when it was issued and when each tap arrived,
+# trial log
+_STATE_HEADER = struct.Struct("<BBHHHHBBIIH16s")
+_TALLY = struct.Struct("<BHH")
+_STATE_VERSION = 6
+
+
+def seeded_sequence(seed: int, index: int, span: int, num_blocks: int) -> List[int]:
+    """
+    Sequence number `index` of a session seeded with `seed`.
+
+    Uses the 32-bit mulberry32 generator and a partial Fisher-Yates shuffle,
+    which are cheap to reproduce on any worker or in the browser.
+    """
+    state = (seed ^ (index * 0x9E3779B9)) & 0xFFFFFFFF
+    blocks = list(range(num_blocks))
+    for i in range(span):
+        state = (state + 0x6D2B79F5) & 0xFFFFFFFF
+        t = ((state ^ (state >> 15)) * (state | 1)) & 0xFFFFFFFF
+        t = ((t + ((t ^ (t >> 7)) * (t | 61))) & 0xFFFFFFFF) ^ t
+        j = i + (t ^ (t >> 14)) % (num_blocks - i)
+        blocks[i], blocks[j] = blocks[j], blocks[i]
+    return blocks[:span]
+
+
+class TrialRejected(Exception):
+    """A submission that doesn't answer the currently issued sequence."""
 
 
 class CorsiEngine:
@@ -14,15 +49,50 @@ class CorsiEngine:
     TRIALS_PER_SPAN = 2
     NUM_BLOCKS = 9  # 3x3 logical blocks
 
-    def __init__(self, candidate_info: Dict):
-        self.db = DatabaseManager()
+    def __init__(
+        self, candidate_info: Dict, db: "DatabaseManager | WriteBehindQueue"
+    ):
+        # Shared, process-wide persistence layer; schema setup happens once
+        # when it is created, not per session. Either the DatabaseManager
+        # itself or a WriteBehindQueue in front of it.
+        self.db = db
         self.candidate_info = candidate_info
-        self.results: List[Dict] = []
+        self.results = TrialLog()
 
         self.current_span = self.MIN_SPAN
         self.current_trial = 1
         self.finished = False
 
+        # Running tallies so progression and scoring never rescan results
+        self.span_attempts: Dict[int, int] = {}
+        self.span_correct: Dict[int, int] = {}
+        self.total_trials = 0
+        self.correct_trials = 0
+        self.last_span = 0  # span of the most recent trial
+        self.best_span = 0  # highest completed span with >= 50% accuracy
+
+        # Sequences are derived from the seed, so state can be rebuilt anywhere
+        self.seed = random.getrandbits(32)
+        # Stored with the session, which the database keeps unique, so a
+        # session is persisted once however often it is uploaded or replayed
+        self.session_key = uuid.uuid4().hex
+        self.sequences_issued = 0
+        # True while the latest issued sequence is still waiting for a response
+        self.pending = False
+        # Taps received so far for the pending sequence, via submit_tap()
+        self.taps = bytearray()
+        # Wall-clock ns when the pending sequence was issued and when each of
+        # its taps arrived, for per-tap latencies
+        self.issued_at_ns = 0
+        self.tap_times = array("q")
+        self._issued: Optional[List[int]] = None  # cache of the pending sequence
+        # Set by replay(): the trials were timestamped by the client, and
+        # the session is dated by its last trial rather than by when it was
+        # uploaded
+        self.replayed = False
+        # Revision of the SQLiteSessionStore row this engine was loaded from
+        self.revision: Optional[int] = None
+
     def start_session(self) -> Dict:
         """
         Called when a new online session begins.
@@ -38,31 +108,231 @@ class CorsiEngine:
             "finished": self.finished,
         }
 
+    def to_bytes(self) -> bytes:
+        """Serialize the session state (everything except the db handle)."""
+        candidate = json.dumps(self.candidate_info, separators=(",", ":")).encode()
+        header = _STATE_HEADER.pack(
+            _STATE_VERSION,
+            self.finished | (self.pending << 1),
+            self.current_span,
+            self.current_trial,
+            self.total_trials,
+            self.correct_trials,
+            self.last_span,
+            self.best_span,
+            self.seed,
+            self.sequences_issued,
+            len(self.span_attempts),
+            bytes.fromhex(self.session_key),
+        )
+        tallies = b"".join(
+            _TALLY.pack(span, attempts, self.span_correct[span])
+            for span, attempts in self.span_attempts.items()
+        )
+        return b"".join(
+            (
+                header,
+                tallies,
+                struct.pack("<I", len(candidate)),
+                candidate,
+                struct.pack("<B", len(self.taps)),
+                self.taps,
+                struct.pack("<q", self.issued_at_ns),
+                self.tap_times.tobytes(),
+                self.results.to_bytes(),
+            )
+        )
+
+    @classmethod
+    def from_bytes(
+        cls, data: bytes, db: "DatabaseManager | WriteBehindQueue"
+    ) -> "CorsiEngine":
+        """Rebuild an engine written by to_bytes()."""
+        (
+            version,
+            flags,
+            current_span,
+            current_trial,
+            total_trials,
+            correct_trials,
+            last_span,
+            best_span,
+            seed,
+            sequences_issued,
+            span_count,
+            session_key,
+        ) = _STATE_HEADER.unpack_from(data)
+        if version != _STATE_VERSION:
+            raise ValueError(f"Unsupported engine state version {version}")
+        offset = _STATE_HEADER.size
+
+        engine = cls({}, db)
+        engine.finished = bool(flags & 1)
+        engine.pending = bool(flags & 2)
+        engine.current_span = current_span
+        engine.current_trial = current_trial
+        engine.total_trials = total_trials
+        engine.correct_trials = correct_trials
+        engine.last_span = last_span
+        engine.best_span = best_span
+        engine.seed = seed
+        engine.sequences_issued = sequences_issued
+        engine.session_key = session_key.hex()
+
+        for _ in range(span_count):
+            span, attempts, correct = _TALLY.unpack_from(data, offset)
+            engine.span_attempts[span] = attempts
+            engine.span_correct[span] = correct
+            offset += _TALLY.size
+
+        (candidate_len,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        engine.candidate_info = json.loads(data[offset : offset + candidate_len])
+        offset += candidate_len
+        tap_count = data[offset]
+        engine.taps = bytearray(data[offset + 1 : offset + 1 + tap_count])
+        offset += 1 + tap_count
+        (engine.issued_at_ns,) = struct.unpack_from("<q", data, offset)
+        offset += 8
+        engine.tap_times.frombytes(
+            data[offset : offset + tap_count * engine.tap_times.itemsize]
+        )
+        offset += tap_count * engine.tap_times.itemsize
+        engine.results = TrialLog.from_bytes(data[offset:])
+        return engine
+
     def new_sequence(self) -> List[int]:
         """Generate a random sequence for the current span length."""
-        return random.sample(range(self.NUM_BLOCKS), self.current_span)
+        sequence = self.sequence_at(self.sequences_issued)
+        self.sequences_issued += 1
+        self.pending = True
+        self.taps.clear()
+        del self.tap_times[:]
+        self.issued_at_ns = time.time_ns()
+        self._issued = sequence
+        return sequence
+
+    @property
+    def sequence_version(self) -> int:
+        """Nonce of the latest issued sequence; submissions must echo it."""
+        return self.sequences_issued
+
+    def sequence_at(self, index: int) -> List[int]:
+        """The index-th sequence of this session, at the current span length."""
+        return seeded_sequence(self.seed, index, self.current_span, self.NUM_BLOCKS)
+
+    def _pending_sequence(self, version: Optional[int]) -> List[int]:
+        if not self.pending:
+            raise TrialRejected("No sequence pending")
+        if version is not None and version != self.sequences_issued:
+            raise TrialRejected("Stale sequence version")
+        if self._issued is None:
+            self._issued = self.sequence_at(self.sequences_issued - 1)
+        return self._issued
 
-    def submit_trial(self, sequence: List[int], response: List[int]) -> Dict:
-        """Record one trial and update progression rules."""
-        correct = sequence == response
+    def submit_trial(
+        self,
+        response: List[int],
+        version: Optional[int] = None,
+        timestamp_ns: Optional[int] = None,
+    ) -> Dict:
+        """
+        Grade a response against the issued sequence, record the trial and
+        update progression rules. Raises TrialRejected if no sequence is
+        pending or version names an older one, and ValueError for a block id
+        outside the grid or a response longer than the sequence. timestamp_ns
+        is when the response was given, for trials recorded elsewhere;
+        defaults to now.
+        """
+        sequence = self._pending_sequence(version)
+        if len(response) > len(sequence):
+            raise ValueError("Response is longer than the sequence")
+        if not all(0 <= block < self.NUM_BLOCKS for block in response):
+            raise ValueError("Invalid block id in trial")
+        return self._record_trial(
+            sequence, response, sequence == response, timestamp_ns
+        )
+
+    def submit_tap(
+        self, block: int, version: Optional[int] = None, index: Optional[int] = None
+    ) -> Dict:
+        """
+        Grade a single tap of the pending sequence. The trial ends as soon
+        as a tap diverges from the sequence or the last one is correct; its
+        result is then returned under "trial_result". index, if given, must
+        be the position of this tap within the response. "latency_ms" is the
+        time since the previous tap, or since the sequence was issued, as
+        received by the server; each trial keeps its taps' latencies.
+        """
+        sequence = self._pending_sequence(version)
+        position = len(self.taps)
+        if index is not None and index != position:
+            raise TrialRejected("Unexpected tap index")
+        if not 0 <= block < self.NUM_BLOCKS:
+            raise ValueError(f"Invalid block id {block}")
+
+        now = time.time_ns()
+        previous = self.tap_times[-1] if self.tap_times else self.issued_at_ns
+        latency_ms = max(now - previous, 0) // 1_000_000
+        self.taps.append(block)
+        self.tap_times.append(now)
+        tap_correct = sequence[position] == block
+        trial_result = None
+        if not tap_correct or position + 1 == len(sequence):
+            trial_result = self._record_trial(
+                sequence,
+                list(self.taps),
+                tap_correct,
+                tap_latencies_ms=self._tap_latencies_ms(),
+            )
+
+        return {
+            "tap_correct": tap_correct,
+            "taps_remaining": len(sequence) - position - 1 if tap_correct else 0,
+            "latency_ms": latency_ms,
+            "trial_result": trial_result,
+        }
+
+    def _tap_latencies_ms(self) -> List[int]:
+        times = [self.issued_at_ns, *self.tap_times]
+        return [max(b - a, 0) // 1_000_000 for a, b in zip(times, times[1:])]
+
+    def _record_trial(
+        self,
+        sequence: List[int],
+        response: List[int],
+        correct: bool,
+        timestamp_ns: Optional[int] = None,
+        tap_latencies_ms: Optional[List[int]] = None,
+    ) -> Dict:
         self.results.append(
-            {
-                "span_length": self.current_span,
-                "trial_number": self.current_trial,
-                "sequence": sequence,
-                "response": response,
-                "correct": correct,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
+            self.current_span,
+            self.current_trial,
+            sequence,
+            response,
+            correct,
+            timestamp_ns,
+            tap_latencies_ms or (),
         )
+        self.pending = False
+        self.taps.clear()
+        del self.tap_times[:]
+        self._issued = None
 
-        span_trials = [
-            r for r in self.results if r["span_length"] == self.current_span
-        ]
+        span = self.current_span
+        attempts = self.span_attempts.get(span, 0) + 1
+        span_correct = self.span_correct.get(span, 0) + correct
+        self.span_attempts[span] = attempts
+        self.span_correct[span] = span_correct
+        self.total_trials += 1
+        self.correct_trials += correct
+        self.last_span = span
 
-        if len(span_trials) >= self.TRIALS_PER_SPAN:
+        if attempts >= self.TRIALS_PER_SPAN:
+            if self._span_passed(span):
+                self.best_span = span
             # Discontinue rule: both trials at this span failed
-            if sum(r["correct"] for r in span_trials) == 0:
+            if span_correct == 0:
                 self.finished = True
             else:
                 if self.current_span < self.MAX_SPAN:
@@ -79,33 +349,64 @@ class CorsiEngine:
             "next_state": self._state(),
         }
 
+    def replay(self, trials: List[Tuple[int, List[int], int]]) -> None:
+        """
+        Re-run a session that was recorded offline from this engine's seed.
+
+        trials holds (version, response, timestamp_ns) in the order they
+        were answered, timestamped by the client's clock; versions may skip
+        sequences the client discarded. Raises TrialRejected unless the
+        trials make up exactly one finished session.
+        """
+        last_timestamp = 0
+        for version, response, timestamp_ns in trials:
+            if self.finished:
+                raise TrialRejected("Trials recorded after the session finished")
+            if version <= self.sequences_issued:
+                raise TrialRejected("Sequence versions must increase")
+            if timestamp_ns < last_timestamp:
+                raise TrialRejected("Trial timestamps must not decrease")
+            last_timestamp = timestamp_ns
+            self.sequences_issued = version - 1
+            self.new_sequence()
+            self.submit_trial(response, version, timestamp_ns)
+
+        if not self.finished:
+            raise TrialRejected("Session is incomplete")
+        self.replayed = True
+
+    def _span_passed(self, span: int) -> bool:
+        """True if trials at this span reached >= 50% accuracy."""
+        attempts = self.span_attempts.get(span, 0)
+        return attempts > 0 and self.span_correct[span] * 2 >= attempts
+
     def calculate_corsi_span(self) -> int:
         """Highest span with >= 50% accuracy."""
-        spans = {r["span_length"] for r in self.results}
-        span_scores = {}
-        for span in spans:
-            trials = [r for r in self.results if r["span_length"] == span]
-            accuracy = sum(t["correct"] for t in trials) / len(trials)
-            if accuracy >= 0.5:
-                span_scores[span] = accuracy
-        return max(span_scores.keys()) if span_scores else 0
+        # Spans only ever increase, so the most recent span is the only one
+        # that can beat the best completed span.
+        if self.last_span > self.best_span and self._span_passed(self.last_span):
+            return self.last_span
+        return self.best_span
 
     def save_session(self) -> Dict:
         """
         Compute summary and save candidate + session to DB.
         This is only called when the task is finished.
         """
-        if not self.results:
+        if not self.total_trials:
             return {}
 
-        total_trials = len(self.results)
-        correct_trials = sum(r["correct"] for r in self.results)
+        total_trials = self.total_trials
+        correct_trials = self.correct_trials
         accuracy = (correct_trials / total_trials) * 100
         corsi_span = self.calculate_corsi_span()
 
         session_data = {
+            "session_key": self.session_key,
             "session_number": int(self.candidate_info.get("session", 1)),
-            "test_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "test_date": (
+                self.results.timestamps[-1] // 1_000_000 if self.replayed else now_ms()
+            ),
             "corsi_span": corsi_span,
             "total_trials": total_trials,
             "correct_trials": correct_trials,
@@ -113,8 +414,14 @@ class CorsiEngine:
             "data_files": [],
         }
 
-        # Only now we persist to database
-        self.db.save_candidate(self.candidate_info)
-        self.db.save_test_session(self.candidate_info["candidate_id"], session_data)
+        # Only now we persist to database. Engines rebuilt from a state
+        # token carry tallies but not the trials behind them; their partial
+        # log would be stored as the whole session, so no trials are saved.
+        complete_log = len(self.results) == self.total_trials
+        self.db.save_session_record(
+            self.candidate_info,
+            session_data,
+            self.results.rows() if complete_log else (),
+        )
 
         return session_data
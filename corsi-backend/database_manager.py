@@ -1,176 +1,469 @@
 # database_manager.py
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
 from contextlib import contextmanager
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# PRAGMA user_version of the current schema:
+# 1 - dates stored as INTEGER epoch milliseconds instead of TEXT
+# 2 - test_sessions.session_key, unique per engine session
+# 3 - trials.tap_latencies_ms, per-tap latencies for tap-by-tap trials
+SCHEMA_VERSION = 3
+
+_CANDIDATES_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        candidate_id TEXT PRIMARY KEY,
+        candidate_name TEXT NOT NULL,
+        age TEXT,
+        gender TEXT,
+        examiner_name TEXT,
+        additional_notes TEXT,
+        date_created INTEGER NOT NULL,
+        total_sessions INTEGER DEFAULT 0,
+        last_session_date INTEGER
+    )
+"""
+
+_TEST_SESSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        candidate_id TEXT NOT NULL,
+        session_number INTEGER NOT NULL,
+        test_date INTEGER NOT NULL,
+        corsi_span INTEGER,
+        total_trials INTEGER,
+        correct_trials INTEGER,
+        accuracy REAL,
+        data_files TEXT,
+        session_key TEXT,
+        FOREIGN KEY (candidate_id) REFERENCES candidates (candidate_id)
+    )
+"""
+
+# Statements are module constants so sqlite3's statement cache reuses the
+# prepared form on every pooled connection.
+
+# Bulk import: registers candidates without touching their session history
+_IMPORT_CANDIDATE = """
+    INSERT INTO candidates
+    (candidate_id, candidate_name, age, gender, examiner_name,
+     additional_notes, date_created, total_sessions, last_session_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+    ON CONFLICT(candidate_id) DO UPDATE SET
+        candidate_name = excluded.candidate_name,
+        age = excluded.age,
+        gender = excluded.gender,
+        examiner_name = excluded.examiner_name,
+        additional_notes = excluded.additional_notes
+"""
+
+# Saving a session upserts its candidate and counts the session.
+# last_session_date only moves forward, so a late offline upload of an
+# earlier session doesn't set it back.
+_UPSERT_CANDIDATE_SESSION = """
+    INSERT INTO candidates
+    (candidate_id, candidate_name, age, gender, examiner_name,
+     additional_notes, date_created, total_sessions, last_session_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT(candidate_id) DO UPDATE SET
+        candidate_name = excluded.candidate_name,
+        age = excluded.age,
+        gender = excluded.gender,
+        examiner_name = excluded.examiner_name,
+        additional_notes = excluded.additional_notes,
+        total_sessions = total_sessions + 1,
+        last_session_date = MAX(
+            IFNULL(last_session_date, 0), excluded.last_session_date
+        )
+"""
+
+# A session whose key is already stored is skipped, not written twice
+_INSERT_SESSION = """
+    INSERT INTO test_sessions
+    (candidate_id, session_number, test_date, corsi_span,
+     total_trials, correct_trials, accuracy, data_files, session_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(session_key) DO NOTHING
+"""
+
+_INSERT_TRIAL = """
+    INSERT INTO trials
+    (session_id, trial_index, span_length, trial_number,
+     sequence, response, correct, timestamp_ns, tap_latencies_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def now_ms() -> int:
+    """Current time as integer epoch milliseconds, the unit of every date column."""
+    return time.time_ns() // 1_000_000
+
+
+def format_ms(ms: Optional[int]) -> Optional[str]:
+    """Render an epoch-millisecond date for API responses."""
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _text_to_ms(text: Optional[str]) -> Optional[int]:
+    if text is None:
+        return None
+    return int(datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+
+def _candidate_params(
+    candidate_info: Dict, now: int, last_session_date: Optional[int]
+) -> Tuple:
+    return (
+        candidate_info["candidate_id"],
+        candidate_info["candidate_name"],
+        candidate_info.get("age"),
+        candidate_info.get("gender"),
+        candidate_info.get("examiner_name"),
+        candidate_info.get("additional_notes"),
+        now,
+        last_session_date,
+    )
+
+
+def _session_params(candidate_id: str, session_data: Dict) -> Tuple:
+    return (
+        candidate_id,
+        session_data["session_number"],
+        session_data["test_date"],
+        session_data["corsi_span"],
+        session_data["total_trials"],
+        session_data["correct_trials"],
+        session_data["accuracy"],
+        json.dumps(session_data.get("data_files", [])),
+        session_data.get("session_key"),
+    )
 
 
 class DatabaseManager:
-    def __init__(self, db_file: str = "candidates_database.db"):
+    def __init__(
+        self,
+        db_file: str = "candidates_database.db",
+        busy_timeout_ms: int = 5000,
+        cache_size_kib: int = 8192,
+        mmap_size: int = 64 * 1024 * 1024,
+    ):
         self.db_file = db_file
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+
+        # Pool: one long-lived connection per thread
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self.connections_opened = 0
+        self.checkouts = 0
+        # Bumped after every committed write, so caches can tell they're stale
+        self.write_version = 0
+
         self.initialize_database()
 
+    def _connect(self) -> sqlite3.Connection:
+        # Each connection stays on the thread that opened it; disabling the
+        # thread check only lets close() tear them all down at shutdown.
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return conn
+
     @contextmanager
     def get_connection(self):
-        conn = sqlite3.connect(self.db_file)
+        """Borrow this thread's pooled connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._pool_lock:
+                self._connections.append(conn)
+                self.connections_opened += 1
+        self.checkouts += 1
         try:
             yield conn
         finally:
-            conn.close()
+            # Never hand an open transaction to the next caller
+            if conn.in_transaction:
+                conn.rollback()
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._pool_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def pool_stats(self) -> Dict:
+        return {
+            "connections": len(self._connections),
+            "connections_opened": self.connections_opened,
+            "checkouts": self.checkouts,
+            "busy_timeout_ms": self.busy_timeout_ms,
+            "cache_size_kib": self.cache_size_kib,
+            "mmap_size": self.mmap_size,
+        }
 
     def initialize_database(self):
         """Create tables if they don't exist."""
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
+            self._migrate_text_dates(conn)
+
+            cursor.execute(_CANDIDATES_TABLE.format(name="candidates"))
+            cursor.execute(_TEST_SESSIONS_TABLE.format(name="test_sessions"))
+
+            # Schema 1 -> 2; sessions saved before then keep a NULL key
+            cursor.execute("PRAGMA table_info(test_sessions)")
+            columns = [row[1] for row in cursor.fetchall()]
+            if "session_key" not in columns:
+                cursor.execute("ALTER TABLE test_sessions ADD COLUMN session_key TEXT")
             cursor.execute(
                 """
-                CREATE TABLE IF NOT EXISTS candidates (
-                    candidate_id TEXT PRIMARY KEY,
-                    candidate_name TEXT NOT NULL,
-                    age TEXT,
-                    gender TEXT,
-                    examiner_name TEXT,
-                    additional_notes TEXT,
-                    date_created TEXT NOT NULL,
-                    total_sessions INTEGER DEFAULT 0,
-                    last_session_date TEXT
-                )
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_key
+                ON test_sessions(session_key)
             """
             )
 
+            # Trial-level data, taps packed one byte each and tap latencies
+            # as little-endian uint32 milliseconds
             cursor.execute(
                 """
-                CREATE TABLE IF NOT EXISTS test_sessions (
-                    session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    candidate_id TEXT NOT NULL,
-                    session_number INTEGER NOT NULL,
-                    test_date TEXT NOT NULL,
-                    corsi_span INTEGER,
-                    total_trials INTEGER,
-                    correct_trials INTEGER,
-                    accuracy REAL,
-                    data_files TEXT,
-                    FOREIGN KEY (candidate_id) REFERENCES candidates (candidate_id)
-                )
+                CREATE TABLE IF NOT EXISTS trials (
+                    session_id INTEGER NOT NULL,
+                    trial_index INTEGER NOT NULL,
+                    span_length INTEGER NOT NULL,
+                    trial_number INTEGER NOT NULL,
+                    sequence BLOB NOT NULL,
+                    response BLOB NOT NULL,
+                    correct INTEGER NOT NULL,
+                    timestamp_ns INTEGER NOT NULL,
+                    tap_latencies_ms BLOB,
+                    PRIMARY KEY (session_id, trial_index),
+                    FOREIGN KEY (session_id) REFERENCES test_sessions (session_id)
+                ) WITHOUT ROWID
             """
             )
+            cursor.execute("PRAGMA table_info(trials)")
+            columns = [row[1] for row in cursor.fetchall()]
+            if "tap_latencies_ms" not in columns:
+                cursor.execute("ALTER TABLE trials ADD COLUMN tap_latencies_ms BLOB")
 
+            # Per-candidate history in session order; also covers the
+            # columns the history summary aggregates. Supersedes the old
+            # single-column idx_sessions_candidate.
             cursor.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_sessions_candidate 
-                ON test_sessions(candidate_id)
+                CREATE INDEX IF NOT EXISTS idx_sessions_candidate_number
+                ON test_sessions(candidate_id, session_number, test_date, corsi_span)
             """
             )
+            cursor.execute("DROP INDEX IF EXISTS idx_sessions_candidate")
+            # Covering index for the recent-sessions feed: newest first with
+            # session_id as tie-breaker, plus the columns the feed returns.
+            # It supersedes the old single-column idx_sessions_date.
             cursor.execute(
                 """
-                CREATE INDEX IF NOT EXISTS idx_sessions_date 
-                ON test_sessions(test_date)
+                CREATE INDEX IF NOT EXISTS idx_sessions_recent
+                ON test_sessions(
+                    test_date, session_id, candidate_id, session_number, corsi_span
+                )
             """
             )
+            cursor.execute("DROP INDEX IF EXISTS idx_sessions_date")
 
+            # Row counts maintained by triggers, so stats never run COUNT(*)
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stats_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """
+            )
+            for table in ("candidates", "test_sessions"):
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert
+                    AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE stats_counters SET value = value + 1
+                        WHERE name = '{table}';
+                    END
+                """
+                )
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete
+                    AFTER DELETE ON {table}
+                    BEGIN
+                        UPDATE stats_counters SET value = value - 1
+                        WHERE name = '{table}';
+                    END
+                """
+                )
+                # Seeded once from the existing rows
+                cursor.execute(
+                    f"""
+                    INSERT OR IGNORE INTO stats_counters (name, value)
+                    SELECT '{table}', COUNT(*) FROM {table}
+                """
+                )
+
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             conn.commit()
         print("✓ Database initialised")
 
-    def save_candidate(self, candidate_info: Dict) -> bool:
-        """Insert or update a candidate."""
+    def _migrate_text_dates(self, conn: sqlite3.Connection):
+        """
+        Schema 0 -> 1: rebuild candidates and test_sessions with INTEGER epoch
+        millisecond dates. The old TEXT dates came from datetime.now(), so
+        they are read back as local time.
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'candidates'"
+        ).fetchone()
+        if version >= 1 or not exists:
+            return
+
+        conn.create_function("text_to_ms", 1, _text_to_ms, deterministic=True)
+        conn.execute("BEGIN")
+        conn.execute(_CANDIDATES_TABLE.format(name="candidates_new"))
+        conn.execute(_TEST_SESSIONS_TABLE.format(name="test_sessions_new"))
+        conn.execute(
+            """
+            INSERT INTO candidates_new
+            SELECT candidate_id, candidate_name, age, gender, examiner_name,
+                   additional_notes, text_to_ms(date_created), total_sessions,
+                   text_to_ms(last_session_date)
+            FROM candidates
+        """
+        )
+        conn.execute(
+            """
+            INSERT INTO test_sessions_new
+            (session_id, candidate_id, session_number, test_date, corsi_span,
+             total_trials, correct_trials, accuracy, data_files)
+            SELECT session_id, candidate_id, session_number, text_to_ms(test_date),
+                   corsi_span, total_trials, correct_trials, accuracy, data_files
+            FROM test_sessions
+        """
+        )
+        # Indexes and triggers go with the old tables and are recreated by
+        # initialize_database
+        conn.execute("DROP TABLE test_sessions")
+        conn.execute("DROP TABLE candidates")
+        conn.execute("ALTER TABLE candidates_new RENAME TO candidates")
+        conn.execute("ALTER TABLE test_sessions_new RENAME TO test_sessions")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        print("✓ Database migrated to integer timestamps")
+
+    def save_candidates(self, candidates: Sequence[Dict]) -> bool:
+        """Insert or update many candidates in a single transaction."""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                cursor.execute(
-                    "SELECT candidate_id FROM candidates WHERE candidate_id = ?",
-                    (candidate_info["candidate_id"],),
+                now = now_ms()
+                conn.executemany(
+                    _IMPORT_CANDIDATE,
+                    [_candidate_params(info, now, None) for info in candidates],
                 )
-                existing = cursor.fetchone()
-
-                if existing:
-                    cursor.execute(
-                        """
-                        UPDATE candidates
-                        SET candidate_name = ?, age = ?, gender = ?,
-                            examiner_name = ?, additional_notes = ?,
-                            last_session_date = ?
-                        WHERE candidate_id = ?
-                    """,
-                        (
-                            candidate_info["candidate_name"],
-                            candidate_info.get("age"),
-                            candidate_info.get("gender"),
-                            candidate_info.get("examiner_name"),
-                            candidate_info.get("additional_notes"),
-                            now,
-                            candidate_info["candidate_id"],
-                        ),
+                conn.commit()
+            self.write_version += 1
+            return True
+        except Exception as e:
+            print("✗ Error importing candidates:", e)
+            return False
+
+    def save_session_record(
+        self, candidate_info: Dict, session_data: Dict, trials: Sequence[Tuple] = ()
+    ) -> bool:
+        """
+        Upsert a candidate and insert their finished session atomically.
+        trials holds TrialLog.rows() for the session.
+        """
+        return self.save_session_records([(candidate_info, session_data, trials)])
+
+    def save_session_records(self, records: List[Tuple[Dict, Dict, Sequence]]) -> bool:
+        """
+        Batched save_session_record for (candidate_info, session_data, trials)
+        records: everything is written in one transaction. Records whose
+        session_key is already stored are skipped.
+        """
+        try:
+            with self.get_connection() as conn:
+                now = now_ms()
+                candidate_rows = []
+                trial_rows = []
+                for info, session, trials in records:
+                    # Each insert is needed for the session_id its trials reference
+                    cursor = conn.execute(
+                        _INSERT_SESSION, _session_params(info["candidate_id"], session)
                     )
-                else:
-                    cursor.execute(
-                        """
-                        INSERT INTO candidates
-                        (candidate_id, candidate_name, age, gender, examiner_name,
-                         additional_notes, date_created, total_sessions, last_session_date)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
-                    """,
-                        (
-                            candidate_info["candidate_id"],
-                            candidate_info["candidate_name"],
-                            candidate_info.get("age"),
-                            candidate_info.get("gender"),
-                            candidate_info.get("examiner_name"),
-                            candidate_info.get("additional_notes"),
-                            now,
-                            now,
-                        ),
+                    if not cursor.rowcount:
+                        continue
+                    candidate_rows.append(
+                        _candidate_params(info, now, session["test_date"])
                     )
+                    trial_rows.extend((cursor.lastrowid, *row) for row in trials)
+                conn.executemany(_UPSERT_CANDIDATE_SESSION, candidate_rows)
+                conn.executemany(_INSERT_TRIAL, trial_rows)
 
                 conn.commit()
+            self.write_version += 1
             return True
         except Exception as e:
-            print("✗ Error saving candidate:", e)
+            print("✗ Error saving session records:", e)
             return False
 
-    def save_test_session(self, candidate_id: str, session_data: Dict) -> bool:
-        """Save test session results."""
+    def get_session_summary(self, session_key: str) -> Optional[Dict]:
+        """
+        The stored summary of a session, in the form save_session() returns.
+        Returns {} if no session has this key and None on database errors.
+        """
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    """
-                    UPDATE candidates
-                    SET total_sessions = total_sessions + 1,
-                        last_session_date = ?
-                    WHERE candidate_id = ?
-                """,
-                    (session_data["test_date"], candidate_id),
-                )
-
-                cursor.execute(
+                row = conn.execute(
                     """
-                    INSERT INTO test_sessions
-                    (candidate_id, session_number, test_date, corsi_span,
-                     total_trials, correct_trials, accuracy, data_files)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    SELECT session_number, test_date, corsi_span, total_trials,
+                           correct_trials, accuracy, data_files
+                    FROM test_sessions WHERE session_key = ?
                 """,
-                    (
-                        candidate_id,
-                        session_data["session_number"],
-                        session_data["test_date"],
-                        session_data["corsi_span"],
-                        session_data["total_trials"],
-                        session_data["correct_trials"],
-                        session_data["accuracy"],
-                        json.dumps(session_data.get("data_files", [])),
-                    ),
-                )
-
-                conn.commit()
-            return True
+                    (session_key,),
+                ).fetchone()
         except Exception as e:
-            print("✗ Error saving test session:", e)
-            return False
+            print("✗ Database error:", e)
+            return None
+        if row is None:
+            return {}
+        return {
+            "session_key": session_key,
+            "session_number": row[0],
+            "test_date": row[1],
+            "corsi_span": row[2],
+            "total_trials": row[3],
+            "correct_trials": row[4],
+            "accuracy": row[5],
+            "data_files": json.loads(row[6]) if row[6] else [],
+        }
 
     def get_stats(self) -> Optional[Dict]:
         """Return counts and recent sessions."""
@@ -178,28 +471,164 @@ class DatabaseManager:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
 
-                cursor.execute("SELECT COUNT(*) FROM candidates")
-                candidate_count = cursor.fetchone()[0]
+                cursor.execute("SELECT name, value FROM stats_counters")
+                counters = dict(cursor.fetchall())
+                candidate_count = counters["candidates"]
+                session_count = counters["test_sessions"]
+
+                recent = [
+                    row[1:] for row in self._recent_sessions(cursor, None, 5)
+                ]
+
+                return {
+                    "candidate_count": candidate_count,
+                    "session_count": session_count,
+                    "recent_sessions": recent,
+                }
+        except Exception as e:
+            print("✗ Database error:", e)
+            return None
+
+    def get_recent_sessions(
+        self, before: Optional[Tuple] = None, limit: int = 20
+    ) -> Optional[List[Tuple]]:
+        """
+        One page of sessions, newest first, as (session_id, candidate_name,
+        session_number, corsi_span, test_date) rows. Pass the
+        (test_date, session_id) of the last row seen as `before` to get the
+        next page.
+        """
+        try:
+            with self.get_connection() as conn:
+                return self._recent_sessions(conn.cursor(), before, limit)
+        except Exception as e:
+            print("✗ Database error:", e)
+            return None
 
-                cursor.execute("SELECT COUNT(*) FROM test_sessions")
-                session_count = cursor.fetchone()[0]
+    def _recent_sessions(self, cursor, before: Optional[Tuple], limit: int) -> List:
+        # Keyset pagination: a range seek on idx_sessions_recent, so each page
+        # costs the same however deep it is.
+        where = "WHERE (t.test_date, t.session_id) < (?, ?)" if before else ""
+        cursor.execute(
+            f"""
+            SELECT t.session_id, c.candidate_name, t.session_number,
+                   t.corsi_span, t.test_date
+            FROM test_sessions t
+            JOIN candidates c ON t.candidate_id = c.candidate_id
+            {where}
+            ORDER BY t.test_date DESC, t.session_id DESC
+            LIMIT ?
+        """,
+            (*before, limit) if before else (limit,),
+        )
+        return cursor.fetchall()
+
+    def get_candidate_history(self, candidate_id: str) -> Optional[Dict]:
+        """
+        A candidate with all their sessions in session order and a summary
+        (count, best/mean span, span trend per session). Returns {} for an
+        unknown candidate and None on database errors.
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
 
                 cursor.execute(
                     """
-                    SELECT c.candidate_name, t.session_number, t.corsi_span, t.test_date
-                    FROM test_sessions t
-                    JOIN candidates c ON t.candidate_id = c.candidate_id
-                    ORDER BY t.test_date DESC
-                    LIMIT 5
-                """
+                    SELECT candidate_id, candidate_name, age, gender, examiner_name,
+                           additional_notes, date_created, total_sessions,
+                           last_session_date
+                    FROM candidates WHERE candidate_id = ?
+                """,
+                    (candidate_id,),
+                )
+                candidate = cursor.fetchone()
+                if candidate is None:
+                    return {}
+
+                cursor.execute(
+                    """
+                    SELECT session_id, session_number, test_date, corsi_span,
+                           total_trials, correct_trials, accuracy
+                    FROM test_sessions
+                    WHERE candidate_id = ?
+                    ORDER BY session_number, test_date
+                """,
+                    (candidate_id,),
+                )
+                sessions = cursor.fetchall()
+
+                # Trend is the least-squares slope of corsi_span over the
+                # session ordinal, computed on the same index range.
+                cursor.execute(
+                    """
+                    WITH s AS (
+                        SELECT corsi_span AS y,
+                               ROW_NUMBER() OVER (
+                                   ORDER BY session_number, test_date
+                               ) AS x
+                        FROM test_sessions
+                        WHERE candidate_id = ?
+                    )
+                    SELECT COUNT(*), MAX(y), AVG(y),
+                           (COUNT(*) * SUM(x * y) - SUM(x) * SUM(y)) * 1.0
+                           / NULLIF(COUNT(*) * SUM(x * x) - SUM(x) * SUM(x), 0)
+                    FROM s
+                """,
+                    (candidate_id,),
                 )
-                recent = cursor.fetchall()
+                summary = cursor.fetchone()
 
                 return {
-                    "candidate_count": candidate_count,
-                    "session_count": session_count,
-                    "recent_sessions": recent,
+                    "candidate": candidate,
+                    "sessions": sessions,
+                    "summary": summary,
                 }
         except Exception as e:
             print("✗ Database error:", e)
             return None
+
+    def iter_sessions_export(self, chunk_size: int = 1000) -> Iterator[List[Tuple]]:
+        """All sessions joined with their candidate, in chunks of rows."""
+        return self._iter_query(
+            """
+            SELECT t.session_id, t.candidate_id, c.candidate_name, c.age, c.gender,
+                   c.examiner_name, t.session_number, t.test_date, t.corsi_span,
+                   t.total_trials, t.correct_trials, t.accuracy
+            FROM test_sessions t
+            JOIN candidates c ON t.candidate_id = c.candidate_id
+            ORDER BY t.session_id
+        """,
+            chunk_size,
+        )
+
+    def iter_trials_export(self, chunk_size: int = 1000) -> Iterator[List[Tuple]]:
+        """All trials in (session_id, trial_index) order, in chunks of rows."""
+        return self._iter_query(
+            """
+            SELECT session_id, trial_index, span_length, trial_number,
+                   sequence, response, correct, timestamp_ns, tap_latencies_ms
+            FROM trials
+            ORDER BY session_id, trial_index
+        """,
+            chunk_size,
+        )
+
+    def _iter_query(self, sql: str, chunk_size: int) -> Iterator[List[Tuple]]:
+        # A dedicated connection rather than the pooled one: streaming
+        # consumers may resume the generator on a different thread. Under
+        # WAL the read sees one consistent snapshot and doesn't block writers.
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        try:
+            cursor = conn.execute(sql)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
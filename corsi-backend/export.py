@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple
+
+from database_manager import format_ms
+from trial_log import unpack_latencies
+
+SESSION_COLUMNS = [
+    "session_id",
+    "candidate_id",
+    "candidate_name",
+    "age",
+    "gender",
+    "examiner_name",
+    "session_number",
+    "test_date",
+    "corsi_span",
+    "total_trials",
+    "correct_trials",
+    "accuracy",
+]
+
+TRIAL_COLUMNS = [
+    "session_id",
+    "trial_index",
+    "span_length",
+    "trial_number",
+    "sequence",
+    "response",
+    "correct",
+    "timestamp_ns",
+    "tap_latencies_ms",
+]
+
+Chunks = Iterable[List[Tuple]]
+
+
+def session_record(row: Tuple) -> list:
+    record = list(row)
+    record[7] = format_ms(record[7])
+    return record
+
+
+def trial_record(row: Tuple) -> list:
+    record = list(row)
+    record[4] = list(record[4])
+    record[5] = list(record[5])
+    record[6] = bool(record[6])
+    record[8] = unpack_latencies(record[8])
+    return record
+
+
+def ndjson_stream(
+    columns: Sequence[str], chunks: Chunks, convert: Callable[[Tuple], list]
+) -> Iterator[bytes]:
+    """One JSON object per line; one output chunk per database chunk."""
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, convert(row))), separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode()
+
+
+def csv_stream(
+    columns: Sequence[str], chunks: Chunks, convert: Callable[[Tuple], list]
+) -> Iterator[bytes]:
+    """CSV with a header row; tap lists are written space-separated."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(columns)
+    yield drain()
+    for rows in chunks:
+        for row in rows:
+            writer.writerow(
+                [
+                    " ".join(map(str, value)) if isinstance(value, list) else value
+                    for value in convert(row)
+                ]
+            )
+        yield drain()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream incrementally into a single gzip member."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
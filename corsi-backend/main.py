@@ -1,18 +1,127 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import json
+import os
+
+from fastapi import (
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, List
 from uuid import uuid4
 
-from corsi_engine import CorsiEngine
-from database_manager import DatabaseManager
+from candidate_import import parse_csv, parse_jsonl
+from corsi_engine import CorsiEngine, TrialRejected
+from database_manager import DatabaseManager, format_ms
+import export
+from session_store import (
+    KeyedLocks,
+    MemorySessionStore,
+    ReplyCache,
+    SessionConflict,
+    SQLiteSessionStore,
+)
+from state_token import KIND_OFFLINE_TICKET, InvalidToken, StateTokenCodec
+from stats_cache import StatsCache
+from write_behind import WriteBehindQueue
+
+
+# Session store limits: at most this many live sessions, dropped after
+# SESSION_TTL seconds without a request; idle sessions are swept every
+# SWEEP_INTERVAL seconds.
+MAX_SESSIONS = 10000
+SESSION_TTL = 30 * 60
+SWEEP_INTERVAL = 60
+
+# "memory" keeps sessions in this process; "sqlite" shares them between
+# uvicorn workers through CORSI_SESSION_DB.
+SESSION_BACKEND = os.environ.get("CORSI_SESSION_BACKEND", "memory")
+SESSION_DB_FILE = os.environ.get("CORSI_SESSION_DB", "sessions.db")
+
+db = DatabaseManager()
+# Blocking database and session-store I/O runs on this many dedicated
+# threads (one pooled SQLite connection each), so handlers can be async and
+# in-flight sessions aren't capped by Starlette's shared threadpool.
+DB_WORKERS = int(os.environ.get("CORSI_DB_WORKERS", "8"))
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="corsi-db")
+# Finished sessions are handed to a background writer that group-commits
+# them, so the final submit-trial doesn't wait on the database.
+writer = WriteBehindQueue(db)
+
+# Session store: session_id -> CorsiEngine
+if SESSION_BACKEND == "sqlite":
+    SESSIONS = SQLiteSessionStore(
+        SESSION_DB_FILE, writer, max_size=MAX_SESSIONS, ttl=SESSION_TTL
+    )
+else:
+    SESSIONS = MemorySessionStore(max_size=MAX_SESSIONS, ttl=SESSION_TTL)
+# Requests on one session run one at a time so overlapping submits
+# (double taps, client retries) can't interleave their engine updates.
+SESSION_LOCKS = KeyedLocks()
+# Recent submit-trial replies, replayed when a client retries a request
+# (same Idempotency-Key, or same sequence version without one)
+REPLIES = ReplyCache(max_sessions=MAX_SESSIONS, per_session=8)
+
+# Stateless mode signs engine state into the X-Corsi-State header. All
+# workers and replicas must share CORSI_TOKEN_SECRET to accept each
+# other's tokens.
+TOKEN_SECRET = os.environ.get("CORSI_TOKEN_SECRET")
+if not TOKEN_SECRET:
+    print("⚠ CORSI_TOKEN_SECRET not set; state tokens are only valid in this process")
+    TOKEN_SECRET = os.urandom(32).hex()
+TOKENS = StateTokenCodec(TOKEN_SECRET.encode(), ttl=SESSION_TTL)
+# Offline sessions may only be uploaded once the device is back online
+OFFLINE_TICKET_TTL = 7 * 24 * 60 * 60
+OFFLINE_TICKETS = StateTokenCodec(
+    TOKEN_SECRET.encode(), ttl=OFFLINE_TICKET_TTL, kind=KIND_OFFLINE_TICKET
+)
+# Bulk import commits this many candidates per transaction and reports at
+# most MAX_IMPORT_ERRORS failing rows.
+IMPORT_BATCH_SIZE = 5000
+MAX_IMPORT_ERRORS = 100
+
+
+async def run_db(func, *args):
+    """Run a blocking database call on DB_EXECUTOR."""
+    return await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, func, *args)
+
+
+async def run_store(func, *args):
+    """Call a SESSIONS method, off the event loop if the backend does I/O."""
+    if SESSIONS.blocking:
+        return await run_db(func, *args)
+    return func(*args)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    writer.start()
+    sweeper = asyncio.create_task(SESSIONS.run_sweeper(SWEEP_INTERVAL, DB_EXECUTOR))
+    yield
+    sweeper.cancel()
+    # Saves still running on the executor enqueue to the writer, so it is
+    # only closed once they have finished
+    DB_EXECUTOR.shutdown(wait=True)
+    writer.close()
+    db.close()
 
 
 app = FastAPI(
     title="Corsi Block Tapping Task API",
     description="Backend API for web-based Corsi task",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS – allow your React dev server
@@ -30,79 +139,509 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session store: session_id -> CorsiEngine
-SESSIONS: Dict[str, CorsiEngine] = {}
-db = DatabaseManager()
-
 
+# Length limits keep a candidate small enough for stateless tokens and
+# offline tickets to fit in a request header.
 class CandidateInfo(BaseModel):
-    examiner_name: str
-    candidate_name: str
-    candidate_id: str
-    age: str | None = None
-    gender: str | None = None
-    session: int = 1
-    additional_notes: str | None = None
+    examiner_name: str = Field(max_length=100)
+    candidate_name: str = Field(max_length=100)
+    candidate_id: str = Field(max_length=64)
+    age: str | None = Field(None, max_length=16)
+    gender: str | None = Field(None, max_length=32)
+    session: int = Field(1, ge=1, le=10000)
+    additional_notes: str | None = Field(None, max_length=500)
 
 
+# Responses never have more taps than the longest sequence
 class TrialSubmission(BaseModel):
     session_id: str
-    sequence: List[int]
-    response: List[int]
+    response: List[int] = Field(max_length=CorsiEngine.MAX_SPAN)
+    # Version returned with the sequence being answered
+    version: int
+    # Also issue the next sequence, saving a /api/sequence round trip
+    include_next: bool = False
+
+
+class StatelessSubmission(BaseModel):
+    response: List[int] = Field(max_length=CorsiEngine.MAX_SPAN)
+    include_next: bool = False
+
+
+class WebSocketSubmission(BaseModel):
+    response: List[int] = Field(max_length=CorsiEngine.MAX_SPAN)
+    version: int
+    include_next: bool = False
+
+
+class WebSocketTap(BaseModel):
+    block: int
+    version: int
+    # Position of this tap within the response, starting at 0
+    index: int
+    include_next: bool = False
+
+
+class TapSubmission(WebSocketTap):
+    session_id: str
+
+
+class OfflineTrial(BaseModel):
+    version: int
+    response: List[int] = Field(max_length=CorsiEngine.MAX_SPAN)
+    # When the response was given, in epoch milliseconds by the device clock
+    timestamp_ms: int = Field(gt=0, lt=10**13)
+
+
+class OfflineUpload(BaseModel):
+    ticket: str
+    trials: List[OfflineTrial]
+
+
+def _summary_response(summary: Dict) -> Dict:
+    """Copy of a save_session() summary with its date formatted for clients."""
+    if not summary:
+        return summary
+    return {**summary, "test_date": format_ms(summary["test_date"])}
 
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Corsi API is running. See /docs for documentation."}
 
 
 @app.post("/api/start-session")
-def start_session(candidate: CandidateInfo):
+async def start_session(candidate: CandidateInfo):
     """Create a new engine for this candidate and return session_id + initial state."""
     session_id = str(uuid4())
-    engine = CorsiEngine(candidate.dict())
-    SESSIONS[session_id] = engine
+    engine = CorsiEngine(candidate.dict(), writer)
+    await run_store(SESSIONS.put, session_id, engine)
     state = engine.start_session()
     return {"session_id": session_id, "state": state}
 
 
-@app.get("/api/sequence/{session_id}")
-def get_sequence(session_id: str):
-    """Get a new sequence for the current span of this session."""
-    engine = SESSIONS.get(session_id)
-    if not engine:
-        raise HTTPException(status_code=404, detail="Session not found")
+async def _store_engine(session_id: str, engine: CorsiEngine) -> None:
+    """
+    put() an engine back. If another worker stored the session first, the
+    change is dropped and the client gets a 409 with the current state.
+    """
+    try:
+        await run_store(SESSIONS.put, session_id, engine)
+    except SessionConflict:
+        current = await run_store(SESSIONS.get, session_id)
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Session was updated by another request",
+                "state": current._state() if current else None,
+                "version": current.sequence_version if current else None,
+            },
+        )
 
-    seq = engine.new_sequence()
+
+async def _issue_sequence(session_id: str) -> Dict:
+    async with SESSION_LOCKS.hold(session_id):
+        engine = await run_store(SESSIONS.get, session_id)
+        if not engine:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        seq = engine.new_sequence()
+        await _store_engine(session_id, engine)
     state = engine._state()
-    return {"sequence": seq, "state": state}
+    return {"sequence": seq, "version": engine.sequence_version, "state": state}
+
+
+async def _submit_trial(
+    session_id: str,
+    response: List[int],
+    version: int,
+    include_next: bool,
+    idempotency_key: str | None,
+):
+    """Grade a response; returns (reply, whether it was replayed from cache)."""
+    key = idempotency_key or f"version:{version}"
+    fingerprint = (version, tuple(response))
+    async with SESSION_LOCKS.hold(session_id):
+        try:
+            cached = REPLIES.get(session_id, key, fingerprint)
+        except KeyError:
+            # Without a key this is a second, different answer to a version
+            # that was already graded, like the engine's stale submissions
+            if idempotency_key is None:
+                raise HTTPException(
+                    status_code=409, detail="Sequence version already answered"
+                )
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key reused for a different trial"
+            )
+        if cached:
+            return cached, True
+
+        engine = await run_store(SESSIONS.get, session_id)
+        if not engine:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        try:
+            result = engine.submit_trial(response, version)
+        except TrialRejected as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        reply = await _after_trial(session_id, engine, result, include_next)
+        REPLIES.put(session_id, key, fingerprint, reply)
+    return reply, False
+
+
+async def _after_trial(
+    session_id: str, engine: CorsiEngine, result: Dict | None, include_next: bool
+) -> Dict:
+    """Persist a finished session or store the updated engine back."""
+    summary = None
+    next_sequence = None
+    if result and result["finished"]:
+        # Store the finished state first: only the request that wins the
+        # put persists the session.
+        await _store_engine(session_id, engine)
+        summary = _summary_response(await run_db(engine.save_session))
+        await run_store(SESSIONS.release, session_id)
+    else:
+        if result and include_next:
+            next_sequence = engine.new_sequence()
+        await _store_engine(session_id, engine)
+    return {
+        "trial_result": result,
+        "summary": summary,
+        "next_sequence": next_sequence,
+        "next_version": engine.sequence_version if next_sequence else None,
+    }
+
+
+async def _submit_tap(
+    session_id: str, block: int, version: int, index: int, include_next: bool
+):
+    """Grade one tap; returns (reply, whether it was replayed from cache)."""
+    key = f"version:{version}:tap:{index}"
+    fingerprint = (version, index, block)
+    async with SESSION_LOCKS.hold(session_id):
+        try:
+            cached = REPLIES.get(session_id, key, fingerprint)
+        except KeyError:
+            raise HTTPException(status_code=409, detail="Tap already recorded")
+        if cached:
+            return cached, True
+
+        engine = await run_store(SESSIONS.get, session_id)
+        if not engine:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        try:
+            tap = engine.submit_tap(block, version, index)
+        except TrialRejected as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid block id in tap")
+
+        reply = await _after_trial(
+            session_id, engine, tap["trial_result"], include_next
+        )
+        reply = {
+            "tap_correct": tap["tap_correct"],
+            "taps_remaining": tap["taps_remaining"],
+            "latency_ms": tap["latency_ms"],
+            **reply,
+        }
+        REPLIES.put(session_id, key, fingerprint, reply)
+    return reply, False
+
+
+@app.get("/api/sequence/{session_id}")
+async def get_sequence(session_id: str):
+    """Get a new sequence for the current span of this session."""
+    return await _issue_sequence(session_id)
 
 
 @app.post("/api/submit-trial")
-def submit_trial(sub: TrialSubmission):
+async def submit_trial(
+    sub: TrialSubmission, idempotency_key: str | None = Header(None)
+):
     """Submit a response and return correctness + next state + summary if finished."""
-    engine = SESSIONS.get(sub.session_id)
-    if not engine:
-        raise HTTPException(status_code=404, detail="Session not found")
+    reply, replayed = await _submit_trial(
+        sub.session_id, sub.response, sub.version, sub.include_next, idempotency_key
+    )
+    if replayed:
+        return JSONResponse(reply, headers={"Idempotent-Replayed": "true"})
+    return reply
 
-    result = engine.submit_trial(sub.sequence, sub.response)
-    summary = engine.save_session() if result["finished"] else None
-    return {"trial_result": result, "summary": summary}
 
+@app.post("/api/tap")
+async def submit_tap(tap: TapSubmission):
+    """
+    Submit one tap of the response. trial_result is set as soon as the
+    trial is decided, which is at the first wrong tap.
+    """
+    reply, replayed = await _submit_tap(
+        tap.session_id, tap.block, tap.version, tap.index, tap.include_next
+    )
+    if replayed:
+        return JSONResponse(reply, headers={"Idempotent-Replayed": "true"})
+    return reply
 
-@app.get("/api/stats")
-def database_stats():
-    """Database statistics for UI."""
+
+@app.websocket("/ws/session/{session_id}")
+async def session_socket(websocket: WebSocket, session_id: str):
+    """
+    Persistent channel for a session started with /api/start-session.
+
+    Client messages are {"type": "next"}, {"type": "response",
+    "response": [...], "version": n, "include_next": bool} and
+    {"type": "tap", "block": b, "version": n, "index": i, "include_next":
+    bool}. The server answers with "sequence", "trial_result" and
+    "tap_result" messages carrying the same fields as the REST endpoints,
+    or "error" with the HTTP status it would have used. The socket is
+    closed once the session finishes.
+    """
+    await websocket.accept()
+    if not await run_store(SESSIONS.get, session_id):
+        await websocket.send_json(
+            {"type": "error", "status": 404, "detail": "Session not found"}
+        )
+        await websocket.close(code=4404)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get("type") if isinstance(message, dict) else None
+            try:
+                if kind == "next":
+                    reply = await _issue_sequence(session_id)
+                    await websocket.send_json({"type": "sequence", **reply})
+                elif kind == "response":
+                    sub = WebSocketSubmission(**message)
+                    reply, _ = await _submit_trial(
+                        session_id, sub.response, sub.version, sub.include_next, None
+                    )
+                    await websocket.send_json({"type": "trial_result", **reply})
+                    if reply["summary"] is not None:
+                        await websocket.close()
+                        return
+                elif kind == "tap":
+                    tap = WebSocketTap(**message)
+                    reply, _ = await _submit_tap(
+                        session_id, tap.block, tap.version, tap.index, tap.include_next
+                    )
+                    await websocket.send_json({"type": "tap_result", **reply})
+                    if reply["summary"] is not None:
+                        await websocket.close()
+                        return
+                else:
+                    raise HTTPException(status_code=400, detail="Unknown message type")
+            except ValidationError as e:
+                await websocket.send_json(
+                    {"type": "error", "status": 422, "detail": str(e)}
+                )
+            except HTTPException as e:
+                await websocket.send_json(
+                    {"type": "error", "status": e.status_code, "detail": e.detail}
+                )
+    except WebSocketDisconnect:
+        pass
+    except ValueError:
+        # receive_json() got a frame that isn't JSON
+        await websocket.close(code=1003)
+
+
+def _decode_token(token: str):
+    try:
+        return TOKENS.decode(token, writer)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
+@app.post("/api/stateless/start-session")
+async def stateless_start_session(candidate: CandidateInfo):
+    """
+    Start a session whose state lives entirely in the returned token.
+    Trials can be retried by resending an older token; use the server-side
+    session endpoints where that matters. The token holds tallies rather
+    than trials, so only the session's summary is stored.
+    """
+    engine = CorsiEngine(candidate.dict(), writer)
+    state = engine.start_session()
+    return {"token": TOKENS.encode(engine), "state": state}
+
+
+@app.get("/api/stateless/sequence")
+async def stateless_sequence(token: str = Header(..., alias="X-Corsi-State")):
+    """Issue the next sequence; the returned token records that it is pending."""
+    engine = _decode_token(token)
+    if engine.finished:
+        raise HTTPException(status_code=409, detail="Session already finished")
+
+    seq = engine.new_sequence()
+    return {
+        "sequence": seq,
+        "state": engine._state(),
+        "token": TOKENS.encode(engine),
+    }
+
+
+@app.post("/api/stateless/submit-trial")
+async def stateless_submit_trial(
+    sub: StatelessSubmission, token: str = Header(..., alias="X-Corsi-State")
+):
+    """Grade a response against the sequence recorded in the token."""
+    engine = _decode_token(token)
+    try:
+        result = engine.submit_trial(sub.response)
+    except TrialRejected as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if result["finished"]:
+        return {
+            "trial_result": result,
+            "summary": _summary_response(await run_db(engine.save_session)),
+            "next_sequence": None,
+            "token": None,
+        }
+
+    next_sequence = engine.new_sequence() if sub.include_next else None
+    return {
+        "trial_result": result,
+        "summary": None,
+        "next_sequence": next_sequence,
+        "token": TOKENS.encode(engine),
+    }
+
+
+@app.post("/api/offline/start-session")
+async def offline_start_session(candidate: CandidateInfo):
+    """
+    Issue a signed ticket for a session the client runs on its own.
+
+    The client regenerates sequences from the seed with the same generator
+    as CorsiEngine and uploads every trial at the end.
+    """
+    engine = CorsiEngine(candidate.dict(), writer)
+    return {
+        "ticket": OFFLINE_TICKETS.encode(engine),
+        "seed": engine.seed,
+        "protocol": {
+            "min_span": engine.MIN_SPAN,
+            "max_span": engine.MAX_SPAN,
+            "trials_per_span": engine.TRIALS_PER_SPAN,
+            "num_blocks": engine.NUM_BLOCKS,
+        },
+        "state": engine.start_session(),
+    }
+
+
+@app.post("/api/offline/upload")
+async def offline_upload(upload: OfflineUpload):
+    """
+    Replay, validate, score and persist a whole offline session. Uploading
+    a ticket again returns the summary that was stored the first time.
+    """
+    try:
+        # Written directly rather than through the writer, so the reply can
+        # report what was actually stored
+        engine = OFFLINE_TICKETS.decode(upload.ticket, db)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    if engine.total_trials or engine.pending:
+        raise HTTPException(status_code=400, detail="Not an offline session ticket")
+
+    stored = await run_db(db.get_session_summary, engine.session_key)
+    if stored is None:
+        raise HTTPException(status_code=500, detail="Database error")
+    if stored:
+        return {"summary": _summary_response(stored)}
+
+    try:
+        engine.replay(
+            [(t.version, t.response, t.timestamp_ms * 1_000_000) for t in upload.trials]
+        )
+    except TrialRejected as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await run_db(engine.save_session)
+    # A concurrent upload of the same ticket may have been stored instead
+    stored = await run_db(db.get_session_summary, engine.session_key)
+    if not stored:
+        raise HTTPException(status_code=500, detail="Database error")
+    return {"summary": _summary_response(stored)}
+
+
+@app.post("/api/candidates/import")
+async def import_candidates(request: Request, format: str = "csv"):
+    """
+    Register candidates from a CSV (with header row) or JSONL request body.
+    Rows are validated as CandidateInfo while the body streams in and
+    upserted in batches of IMPORT_BATCH_SIZE.
+    """
+    parsers = {"csv": parse_csv, "jsonl": parse_jsonl}
+    if format not in parsers:
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+
+    imported = 0
+    failed = 0
+    errors: List[Dict] = []
+
+    def reject(line, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"line": line, "error": message})
+
+    async def flush(batch):
+        nonlocal imported
+        if await run_db(db.save_candidates, [info for _, info in batch]):
+            imported += len(batch)
+        else:
+            for line, _ in batch:
+                reject(line, "Database error")
+
+    batch = []
+    async for line, row, error in parsers[format](request.stream()):
+        if error:
+            reject(line, error)
+            continue
+        try:
+            batch.append((line, CandidateInfo(**row).dict()))
+        except ValidationError as e:
+            fields = (".".join(map(str, err["loc"])) for err in e.errors())
+            messages = (err["msg"] for err in e.errors())
+            reject(line, "; ".join(f"{f}: {m}" for f, m in zip(fields, messages)))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+
+
+def _build_stats():
     stats = db.get_stats()
     if not stats:
-        raise HTTPException(status_code=500, detail="Database error")
+        return None
 
     formatted_recent = [
         {
             "candidate_name": row[0],
             "session_number": row[1],
             "corsi_span": row[2],
-            "test_date": row[3],
+            "test_date": format_ms(row[3]),
         }
         for row in stats["recent_sessions"]
     ]
@@ -112,3 +651,194 @@ def database_stats():
         "session_count": stats["session_count"],
         "recent_sessions": formatted_recent,
     }
+
+
+# Stats are served from memory and rebuilt after local writes, or after
+# STATS_MAX_AGE seconds to pick up other workers' writes.
+STATS_MAX_AGE = 5.0
+STATS = StatsCache(db, _build_stats, max_age=STATS_MAX_AGE)
+
+
+@app.get("/api/stats")
+async def database_stats(if_none_match: str | None = Header(None)):
+    """Database statistics for UI. Supports conditional GET via ETag."""
+    cached = STATS.cached() or await run_db(STATS.get)
+    if not cached:
+        raise HTTPException(status_code=500, detail="Database error")
+
+    payload, etag = cached
+    # no-cache: clients may keep the body but must revalidate every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+def _encode_cursor(test_date: int, session_id: int) -> str:
+    raw = json.dumps([test_date, session_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        test_date, session_id = json.loads(base64.urlsafe_b64decode(cursor))
+        values = int(test_date), int(session_id)
+        # SQLite binds signed 64-bit integers only
+        if not all(-(2**63) <= value < 2**63 for value in values):
+            raise ValueError("Cursor value out of range")
+        return values
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/api/sessions")
+async def recent_sessions(
+    before: str | None = None, limit: int = Query(20, ge=1, le=100)
+):
+    """Sessions newest first, paginated with the opaque next_cursor."""
+    cursor = _decode_cursor(before) if before else None
+    rows = await run_db(db.get_recent_sessions, cursor, limit)
+    if rows is None:
+        raise HTTPException(status_code=500, detail="Database error")
+
+    sessions = [
+        {
+            "session_id": row[0],
+            "candidate_name": row[1],
+            "session_number": row[2],
+            "corsi_span": row[3],
+            "test_date": format_ms(row[4]),
+        }
+        for row in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = _encode_cursor(rows[-1][4], rows[-1][0])
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+
+@app.get("/api/candidates/{candidate_id}/sessions")
+async def candidate_sessions(candidate_id: str):
+    """All sessions of one candidate plus a best-span/trend summary."""
+    history = await run_db(db.get_candidate_history, candidate_id)
+    if history is None:
+        raise HTTPException(status_code=500, detail="Database error")
+    if not history:
+        raise HTTPException(status_code=404, detail="Candidate not found")
+
+    candidate = history["candidate"]
+    session_count, best_span, mean_span, span_trend = history["summary"]
+    return {
+        "candidate": {
+            "candidate_id": candidate[0],
+            "candidate_name": candidate[1],
+            "age": candidate[2],
+            "gender": candidate[3],
+            "examiner_name": candidate[4],
+            "additional_notes": candidate[5],
+            "date_created": format_ms(candidate[6]),
+            "total_sessions": candidate[7],
+            "last_session_date": format_ms(candidate[8]),
+        },
+        "sessions": [
+            {
+                "session_id": row[0],
+                "session_number": row[1],
+                "test_date": format_ms(row[2]),
+                "corsi_span": row[3],
+                "total_trials": row[4],
+                "correct_trials": row[5],
+                "accuracy": row[6],
+            }
+            for row in history["sessions"]
+        ],
+        "summary": {
+            "session_count": session_count,
+            "best_span": best_span,
+            "mean_span": mean_span,
+            "span_trend": span_trend,
+        },
+    }
+
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def _iterate_db(iterator):
+    """Pull chunks from a blocking iterator on DB_EXECUTOR."""
+    done = object()
+    try:
+        while True:
+            chunk = await run_db(next, iterator, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        await run_db(iterator.close)
+
+
+def _export_response(name, columns, chunks, convert, fmt: str, gzip: bool):
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    encode = export.ndjson_stream if fmt == "ndjson" else export.csv_stream
+    body = encode(columns, chunks, convert)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    if gzip:
+        body = export.gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _iterate_db(body), media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers
+    )
+
+
+@app.get("/api/export/sessions")
+async def export_sessions(format: str = "ndjson", gzip: bool = False):
+    """Stream every session joined with its candidate, in constant memory."""
+    return _export_response(
+        "sessions",
+        export.SESSION_COLUMNS,
+        db.iter_sessions_export(),
+        export.session_record,
+        format,
+        gzip,
+    )
+
+
+@app.get("/api/export/trials")
+async def export_trials(format: str = "ndjson", gzip: bool = False):
+    """Stream every recorded trial, in constant memory."""
+    return _export_response(
+        "trials",
+        export.TRIAL_COLUMNS,
+        db.iter_trials_export(),
+        export.trial_record,
+        format,
+        gzip,
+    )
+
+
+@app.get("/api/session-store")
+async def session_store_stats():
+    """Live session counts plus hit/eviction counters."""
+    stats = await run_store(SESSIONS.stats)
+    return {
+        **stats,
+        "locked_sessions": len(SESSION_LOCKS),
+        "reply_cache": REPLIES.stats(),
+    }
+
+
+@app.get("/api/write-behind")
+async def write_behind_stats():
+    """Background persistence queue depth and batch counters."""
+    return writer.stats()
+
+
+@app.get("/api/db-pool")
+async def db_pool_stats():
+    """SQLite connection pool statistics."""
+    return db.pool_stats()
@@ -0,0 +1,391 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional
+
+from corsi_engine import CorsiEngine
+from database_manager import DatabaseManager
+from write_behind import WriteBehindQueue
+
+
+class SessionConflict(Exception):
+    """put() lost a race: the session changed after this engine was loaded."""
+
+
+class SessionStore(ABC):
+    """
+    Interface for session_id -> CorsiEngine storage.
+
+    Callers must put() an engine back after mutating it; backends that
+    serialize state rely on that to see the change, and may raise
+    SessionConflict if another request stored the session first. Backends
+    whose methods do I/O set blocking, so async callers know to run them
+    off the event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[CorsiEngine]: ...
+
+    @abstractmethod
+    def put(self, session_id: str, engine: CorsiEngine) -> None: ...
+
+    @abstractmethod
+    def release(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    def sweep(self) -> int: ...
+
+    @abstractmethod
+    def stats(self) -> Dict: ...
+
+    async def run_sweeper(self, interval: float = 60, executor=None) -> None:
+        """Background task: sweep idle sessions every interval seconds."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if self.blocking:
+                await loop.run_in_executor(executor, self.sweep)
+            else:
+                self.sweep()
+
+
+class KeyedLocks:
+    """
+    One asyncio.Lock per key, created on first use and dropped once nobody
+    holds or waits for it.
+
+    Requests for the same session run one at a time while different
+    sessions never wait on each other. Locks are per event loop, so they
+    only serialize requests within one process.
+    """
+
+    def __init__(self):
+        # key -> [lock, number of holders + waiters]
+        self._locks: Dict[str, List] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class ReplyCache:
+    """
+    The last few replies of each session, keyed by idempotency key.
+
+    Sessions are kept in least-recently-used order, at most max_sessions
+    of them with up to per_session replies each. Each reply is stored with
+    a fingerprint of the request that produced it so a reused key with a
+    different request can be told apart from a retry. Replies only live in
+    this process.
+    """
+
+    def __init__(self, max_sessions: int = 10000, per_session: int = 8):
+        self.max_sessions = max_sessions
+        self.per_session = per_session
+        # session_id -> OrderedDict(key -> (fingerprint, reply))
+        self._sessions: "OrderedDict[str, OrderedDict]" = OrderedDict()
+
+        self.hits = 0
+        self.conflicts = 0
+
+    def get(self, session_id: str, key: str, fingerprint: Hashable) -> Optional[Any]:
+        """
+        Return the cached reply for key, or None if there is none. Raises
+        KeyError if key was used for a different request.
+        """
+        replies = self._sessions.get(session_id)
+        if replies is None or key not in replies:
+            return None
+        cached_fingerprint, reply = replies[key]
+        if cached_fingerprint != fingerprint:
+            self.conflicts += 1
+            raise KeyError(key)
+        self._sessions.move_to_end(session_id)
+        self.hits += 1
+        return reply
+
+    def put(self, session_id: str, key: str, fingerprint: Hashable, reply: Any) -> None:
+        replies = self._sessions.get(session_id)
+        if replies is None:
+            replies = self._sessions[session_id] = OrderedDict()
+        replies[key] = (fingerprint, reply)
+        while len(replies) > self.per_session:
+            replies.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "conflicts": self.conflicts,
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Bounded in-memory store: session_id -> CorsiEngine.
+
+    Entries are kept in least-recently-used order. Adding a session beyond
+    max_size evicts the oldest one, and sessions idle for longer than ttl
+    seconds are dropped on access or by sweep().
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        # session_id -> (engine, last access time)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.releases = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> Optional[CorsiEngine]:
+        """Return the engine for session_id, or None if unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[session_id]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries[session_id] = (entry[0], now)
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session_id: str, engine: CorsiEngine) -> None:
+        """Add or refresh a session, evicting the least recently used ones."""
+        with self._lock:
+            self._entries[session_id] = (engine, time.monotonic())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def release(self, session_id: str) -> None:
+        """Drop a session as soon as it no longer needs to be served."""
+        with self._lock:
+            if self._entries.pop(session_id, None) is not None:
+                self.releases += 1
+
+    def sweep(self) -> int:
+        """Remove idle sessions and return how many were dropped."""
+        cutoff = time.monotonic() - self.ttl
+        removed = 0
+        with self._lock:
+            # LRU order means every expired entry sits at the front
+            while self._entries:
+                session_id, (_, last_access) = next(iter(self._entries.items()))
+                if last_access > cutoff:
+                    break
+                del self._entries[session_id]
+                removed += 1
+            self.expirations += removed
+        return removed
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "releases": self.releases,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store shared by every process that opens the same SQLite file.
+
+    Engines are stored in their compact CorsiEngine.to_bytes() form, so any
+    uvicorn worker can pick up a session started on another one. The file
+    runs in WAL mode so readers and the single writer don't block each other.
+
+    Every row carries a revision. put() only overwrites the revision the
+    engine was loaded at, so two workers updating the same session can't
+    silently drop one another's changes.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        db_file: str,
+        db: "DatabaseManager | WriteBehindQueue",
+        max_size: int = 10000,
+        ttl: float = 30 * 60,
+    ):
+        self.db_file = db_file
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.releases = 0
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                revision INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        if "revision" not in columns:
+            conn.execute(
+                "ALTER TABLE sessions ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"
+            )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_access
+            ON sessions(last_access)
+        """
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One long-lived connection per thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[CorsiEngine]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT state, last_access, revision FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is not None and time.time() - row[1] > self.ttl:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.commit()
+            self.expirations += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        engine = CorsiEngine.from_bytes(row[0], self.db)
+        engine.revision = row[2]
+        return engine
+
+    def put(self, session_id: str, engine: CorsiEngine) -> None:
+        """
+        Insert a new session, or update the one engine was loaded from.
+        Raises SessionConflict if the row was changed or removed meanwhile.
+        """
+        conn = self._connection()
+        if engine.revision is None:
+            try:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, state, last_access, revision) "
+                    "VALUES (?, ?, ?, 0)",
+                    (session_id, engine.to_bytes(), time.time()),
+                )
+            except sqlite3.IntegrityError:
+                raise SessionConflict(session_id)
+        else:
+            updated = conn.execute(
+                "UPDATE sessions SET state = ?, last_access = ?, "
+                "revision = revision + 1 WHERE session_id = ? AND revision = ?",
+                (engine.to_bytes(), time.time(), session_id, engine.revision),
+            ).rowcount
+            if not updated:
+                conn.rollback()
+                raise SessionConflict(session_id)
+        conn.commit()
+        engine.revision = 0 if engine.revision is None else engine.revision + 1
+
+    def release(self, session_id: str) -> None:
+        conn = self._connection()
+        cursor = conn.execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        conn.commit()
+        if cursor.rowcount:
+            self.releases += 1
+
+    def sweep(self) -> int:
+        """Drop idle sessions, then the oldest ones above max_size."""
+        conn = self._connection()
+        expired = conn.execute(
+            "DELETE FROM sessions WHERE last_access < ?", (time.time() - self.ttl,)
+        ).rowcount
+        evicted = conn.execute(
+            """
+            DELETE FROM sessions WHERE session_id IN (
+                SELECT session_id FROM sessions
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+        """,
+            (self.max_size,),
+        ).rowcount
+        conn.commit()
+
+        self.expirations += expired
+        self.evictions += evicted
+        return expired + evicted
+
+    def stats(self) -> Dict:
+        conn = self._connection()
+        size = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "releases": self.releases,
+        }
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import json
+import struct
+import time
+
+from corsi_engine import CorsiEngine
+from database_manager import DatabaseManager
+from write_behind import WriteBehindQueue
+
+# Payload layout: header, one (attempts, correct) byte pair per span from
+# MIN_SPAN to last_span, then the candidate JSON.
+_HEADER = struct.Struct("<BBBBBBBIHI16s")
+_TOKEN_VERSION = 3
+_MAC_SIZE = 16
+
+FLAG_FINISHED = 0x01
+FLAG_PENDING = 0x02  # a sequence has been issued and not yet answered
+
+# Signed into every token, so one codec's tokens are rejected by another
+# even when they share a secret
+KIND_STATE = 1
+KIND_OFFLINE_TICKET = 2
+
+
+class InvalidToken(Exception):
+    """Raised for tokens that are malformed, forged or expired."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class StateTokenCodec:
+    """
+    Packs the complete state of a CorsiEngine into an HMAC-signed token.
+
+    The token carries the progression state, the per-span tallies and the
+    sequence seed, so the server keeps nothing per session and any worker
+    holding the same secret can serve the next request. Tokens are
+    tamper-evident and expire after ttl seconds, but they are not
+    single-use: a client can resend an older, still valid token.
+
+    Stateless mode therefore cannot prevent a trial from being retried.
+    Resending the token a sequence was issued with grades that sequence
+    again, so a wrong answer can be replaced by a right one. What it does
+    guarantee is that a session is persisted once: the token carries the
+    engine's session_key, which the database keeps unique, so replaying
+    the final trial never stores a second session.
+    """
+
+    def __init__(self, secret: bytes, ttl: float = 30 * 60, kind: int = KIND_STATE):
+        self.secret = secret
+        self.ttl = ttl
+        self.kind = kind
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:_MAC_SIZE]
+
+    def encode(self, engine: CorsiEngine) -> str:
+        flags = (FLAG_FINISHED if engine.finished else 0) | (
+            FLAG_PENDING if engine.pending else 0
+        )
+        header = _HEADER.pack(
+            _TOKEN_VERSION,
+            self.kind,
+            flags,
+            engine.current_span,
+            engine.current_trial,
+            engine.last_span,
+            engine.best_span,
+            engine.seed,
+            engine.sequences_issued,
+            int(time.time() + self.ttl),
+            bytes.fromhex(engine.session_key),
+        )
+        tallies = bytearray()
+        for span in range(engine.MIN_SPAN, engine.last_span + 1):
+            tallies.append(engine.span_attempts.get(span, 0))
+            tallies.append(engine.span_correct.get(span, 0))
+        # Raw UTF-8 takes at most 4 bytes per character; \uXXXX escapes of
+        # non-BMP characters would take 12
+        candidate = json.dumps(
+            engine.candidate_info, separators=(",", ":"), ensure_ascii=False
+        ).encode()
+
+        payload = header + bytes(tallies) + candidate
+        return _b64encode(payload) + "." + _b64encode(self._sign(payload))
+
+    def decode(
+        self, token: str, db: "DatabaseManager | WriteBehindQueue"
+    ) -> CorsiEngine:
+        """Verify a token and rebuild its engine."""
+        try:
+            payload_text, mac_text = token.split(".")
+            payload = _b64decode(payload_text)
+            mac = _b64decode(mac_text)
+        except ValueError:
+            raise InvalidToken("Malformed state token")
+        if not hmac.compare_digest(mac, self._sign(payload)):
+            raise InvalidToken("State token signature mismatch")
+
+        (
+            version,
+            kind,
+            flags,
+            current_span,
+            current_trial,
+            last_span,
+            best_span,
+            seed,
+            sequences_issued,
+            expires,
+            session_key,
+        ) = _HEADER.unpack_from(payload)
+        if version != _TOKEN_VERSION:
+            raise InvalidToken("Unsupported state token version")
+        if kind != self.kind:
+            raise InvalidToken("Wrong kind of token")
+        if time.time() > expires:
+            raise InvalidToken("State token expired")
+
+        engine = CorsiEngine({}, db)
+        engine.finished = bool(flags & FLAG_FINISHED)
+        engine.pending = bool(flags & FLAG_PENDING)
+        engine.current_span = current_span
+        engine.current_trial = current_trial
+        engine.last_span = last_span
+        engine.best_span = best_span
+        engine.seed = seed
+        engine.sequences_issued = sequences_issued
+        engine.session_key = session_key.hex()
+
+        offset = _HEADER.size
+        for span in range(engine.MIN_SPAN, last_span + 1):
+            attempts, correct = payload[offset], payload[offset + 1]
+            offset += 2
+            if attempts:
+                engine.span_attempts[span] = attempts
+                engine.span_correct[span] = correct
+                engine.total_trials += attempts
+                engine.correct_trials += correct
+        engine.candidate_info = json.loads(payload[offset:])
+
+        return engine
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from database_manager import DatabaseManager
+
+
+class StatsCache:
+    """
+    In-process snapshot of the /api/stats payload, with its ETag.
+
+    The snapshot is rebuilt only when DatabaseManager.write_version has
+    moved (this process persisted something) or after max_age seconds,
+    which picks up writes made by other workers.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        build: Callable[[], Optional[Dict]],
+        max_age: float = 5.0,
+    ):
+        self.db = db
+        self.build = build
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Tuple[Dict, str]] = None
+        self._version = -1
+        self._built_at = 0.0
+
+        self.hits = 0
+        self.rebuilds = 0
+
+    def _fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._version == self.db.write_version
+            and time.monotonic() - self._built_at < self.max_age
+        )
+
+    def cached(self) -> Optional[Tuple[Dict, str]]:
+        """Return (payload, etag) if the snapshot is fresh, without any I/O."""
+        if self._fresh():
+            self.hits += 1
+            return self._snapshot
+        return None
+
+    def get(self) -> Optional[Tuple[Dict, str]]:
+        """Return (payload, etag), or None if the database can't be read."""
+        cached = self.cached()
+        if cached:
+            return cached
+
+        with self._lock:
+            # Another request may have rebuilt it while we waited
+            if self._fresh():
+                self.hits += 1
+                return self._snapshot
+
+            version = self.db.write_version
+            payload = self.build()
+            if payload is None:
+                return None
+
+            body = json.dumps(payload, sort_keys=True).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            self._snapshot = (payload, etag)
+            self._version = version
+            self._built_at = time.monotonic()
+            self.rebuilds += 1
+            return self._snapshot
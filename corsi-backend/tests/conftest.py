@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import sys
+
+import httpx
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend modules import each other as top-level modules
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def workers(monkeypatch, tmp_path):
+    """
+    Returns start(count), which imports count fresh copies of main, as
+    separate uvicorn workers would. They share the database, session store
+    and token secret in tmp_path.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CORSI_SESSION_DB", str(tmp_path / "sessions.db"))
+    monkeypatch.setenv("CORSI_TOKEN_SECRET", "test-secret")
+    apps = []
+
+    def start(count=1):
+        for _ in range(count):
+            spec = importlib.util.spec_from_file_location(
+                f"main_{len(apps)}", os.path.join(BACKEND_DIR, "main.py")
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            apps.append(module)
+        return apps
+
+    yield start
+    for module in apps:
+        module.DB_EXECUTOR.shutdown()
+        module.writer.close()
+        module.db.close()
+
+
+@pytest.fixture
+def client():
+    """Returns connect(module), an httpx client for that copy of main's app."""
+
+    def connect(module):
+        transport = httpx.ASGITransport(app=module.app)
+        return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+    return connect
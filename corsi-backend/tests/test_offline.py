@@ -0,0 +1,221 @@
+"""
+Offline sessions: the browser regenerates sequences from the ticket's seed
+with offlineSession.js, and the server replays the uploaded trials through
+CorsiEngine. Both sides must produce the same sequences.
+"""
+import asyncio
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import subprocess
+import time
+
+import pytest
+
+from corsi_engine import CorsiEngine, seeded_sequence
+from state_token import (
+    KIND_OFFLINE_TICKET,
+    KIND_STATE,
+    InvalidToken,
+    StateTokenCodec,
+)
+
+OFFLINE_SESSION_JS = pathlib.Path(__file__).resolve().parents[2] / (
+    "corsi-frontend/src/offlineSession.js"
+)
+
+CANDIDATE = {
+    "examiner_name": "Examiner",
+    "candidate_name": "Candidate",
+    "candidate_id": "C-001",
+}
+
+# (seed, index, span, sequence) from seeded_sequence() with 9 blocks; the
+# same values must come out of seededSequence() in offlineSession.js
+SEQUENCE_VECTORS = [
+    (0x00000000, 0, 2, [8, 0]),
+    (0x00000001, 1, 3, [8, 7, 5]),
+    (0x2545F491, 0, 4, [7, 2, 6, 1]),
+    (0xDEADBEEF, 7, 5, [2, 6, 5, 4, 7]),
+    (0x80000000, 13, 6, [3, 1, 7, 8, 6, 4]),
+    (0xFFFFFFFF, 1000, 7, [7, 5, 2, 8, 3, 0, 1]),
+    (0x075BCD15, 65535, 8, [2, 4, 1, 0, 5, 6, 7, 3]),
+]
+
+# Sessions are recorded a day before they are uploaded
+RECORDED_MS = int(time.time() * 1000) - 24 * 60 * 60 * 1000
+
+requires_node = pytest.mark.skipif(
+    shutil.which("node") is None, reason="node is not installed"
+)
+
+
+def run_node(script, data):
+    """Run an ES module script with offlineSession.js imported as `offline`."""
+    source = f"import * as offline from {json.dumps(OFFLINE_SESSION_JS.as_uri())};\n"
+    completed = subprocess.run(
+        ["node", "--input-type=module", "-e", source + script],
+        input=json.dumps(data),
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=30,
+    )
+    return json.loads(completed.stdout)
+
+
+READ_STDIN = """
+let input = "";
+for await (const chunk of process.stdin) input += chunk;
+const data = JSON.parse(input);
+"""
+
+
+def answer(span, sequence):
+    """Correct up to span 4, then wrong, so the session stops at span 5."""
+    return sequence if span < 5 else sequence[::-1]
+
+
+def run_client(offline):
+    """Run an offline session with the progression rules of offlineSession.js."""
+    protocol = offline["protocol"]
+    span = protocol["min_span"]
+    attempts = correct = version = 0
+    trials = []
+    while True:
+        sequence = seeded_sequence(
+            offline["seed"], version, span, protocol["num_blocks"]
+        )
+        version += 1
+        response = answer(span, sequence)
+        trials.append(
+            {
+                "version": version,
+                "response": response,
+                "timestamp_ms": RECORDED_MS + 1000 * version,
+            }
+        )
+        attempts += 1
+        correct += response == sequence
+        if attempts == protocol["trials_per_span"]:
+            if not correct or span == protocol["max_span"]:
+                return trials
+            span += 1
+            attempts = correct = 0
+
+
+@pytest.mark.parametrize("seed,index,span,expected", SEQUENCE_VECTORS)
+def test_seeded_sequence_vectors(seed, index, span, expected):
+    assert seeded_sequence(seed, index, span, CorsiEngine.NUM_BLOCKS) == expected
+
+
+@requires_node
+def test_js_seeded_sequence_vectors():
+    script = READ_STDIN + """
+const out = data.map(([seed, index, span]) =>
+  offline.seededSequence(seed, index, span, 9)
+);
+console.log(JSON.stringify(out));
+"""
+    cases = [vector[:3] for vector in SEQUENCE_VECTORS]
+    assert run_node(script, cases) == [vector[3] for vector in SEQUENCE_VECTORS]
+
+
+def test_offline_ticket_round_trip():
+    tickets = StateTokenCodec(b"secret", kind=KIND_OFFLINE_TICKET)
+    engine = CorsiEngine(dict(CANDIDATE), None)
+
+    decoded = tickets.decode(tickets.encode(engine), None)
+    assert decoded.seed == engine.seed
+    assert decoded.session_key == engine.session_key
+    assert decoded.candidate_info == CANDIDATE
+    assert decoded.sequence_at(3) == engine.sequence_at(3)
+    # A ticket never passes for a state token, even with the same secret
+    with pytest.raises(InvalidToken):
+        StateTokenCodec(b"secret", kind=KIND_STATE).decode(
+            tickets.encode(engine), None
+        )
+
+
+def upload(workers, client, make_trials):
+    """Start an offline session, record it and upload it twice."""
+    (main,) = workers()
+
+    async def run():
+        async with main.lifespan(main.app), client(main) as http:
+            offline = (
+                await http.post("/api/offline/start-session", json=CANDIDATE)
+            ).json()
+            payload = {"ticket": offline["ticket"], "trials": make_trials(offline)}
+            first = await http.post("/api/offline/upload", json=payload)
+            second = await http.post("/api/offline/upload", json=payload)
+            return payload["trials"], first, second
+
+    return asyncio.run(run())
+
+
+def assert_stored(trials, summary):
+    conn = sqlite3.connect("candidates_database.db")
+    sessions = conn.execute(
+        "SELECT session_key, test_date, total_trials FROM test_sessions"
+    ).fetchall()
+    # Dated by the last trial, not by the upload
+    assert sessions == [
+        (summary["session_key"], trials[-1]["timestamp_ms"], len(trials))
+    ]
+    stored = conn.execute(
+        "SELECT trial_index, response, timestamp_ns FROM trials ORDER BY trial_index"
+    ).fetchall()
+    assert stored == [
+        (i, bytes(t["response"]), t["timestamp_ms"] * 1_000_000)
+        for i, t in enumerate(trials)
+    ]
+    assert conn.execute(
+        "SELECT total_sessions, last_session_date FROM candidates"
+    ).fetchall() == [(1, trials[-1]["timestamp_ms"])]
+    conn.close()
+
+
+def test_offline_replay_and_upload(workers, client):
+    trials, first, second = upload(workers, client, run_client)
+
+    assert first.status_code == 200, first.text
+    summary = first.json()["summary"]
+    assert summary["total_trials"] == len(trials) == 8
+    assert summary["correct_trials"] == 6
+    assert summary["corsi_span"] == 4
+    # Uploading the same ticket again returns the stored session
+    assert second.json() == first.json()
+    assert_stored(trials, summary)
+
+
+@requires_node
+def test_js_offline_session_replays_on_server(workers, client):
+    script = READ_STDIN + """
+const session = new offline.OfflineSession(data);
+let timestamp = data.recorded_ms;
+while (!session.finished) {
+  const { sequence } = session.newSequence();
+  const response = session.currentSpan < 5 ? sequence : [...sequence].reverse();
+  session.submitTrial(response);
+  session.trials.at(-1).timestamp_ms = (timestamp += 1000);
+}
+console.log(JSON.stringify(session.uploadPayload().trials));
+"""
+
+    def make_trials(offline):
+        trials = run_node(script, dict(offline, recorded_ms=RECORDED_MS))
+        # Same sequences and progression as the Python client
+        assert trials == run_client(offline)
+        return trials
+
+    trials, first, second = upload(workers, client, make_trials)
+
+    assert first.status_code == 200, first.text
+    summary = first.json()["summary"]
+    assert summary["total_trials"] == 8
+    assert summary["corsi_span"] == 4
+    assert second.json() == first.json()
+    assert_stored(trials, summary)
@@ -0,0 +1,143 @@
+"""
+Concurrent submits against one session: exactly one trial is recorded and
+every other request is replayed from the reply cache or rejected with 409.
+"""
+import asyncio
+
+import pytest
+
+CONCURRENT_SUBMITS = 50
+
+CANDIDATE = {
+    "examiner_name": "Examiner",
+    "candidate_name": "Candidate",
+    "candidate_id": "C-001",
+}
+
+
+@pytest.fixture(params=["memory", "sqlite"], autouse=True)
+def backend(request, monkeypatch):
+    monkeypatch.setenv("CORSI_SESSION_BACKEND", request.param)
+    return request.param
+
+
+async def start_trial(http):
+    started = await http.post("/api/start-session", json=CANDIDATE)
+    session_id = started.json()["session_id"]
+    issued = (await http.get(f"/api/sequence/{session_id}")).json()
+    return session_id, issued["sequence"], issued["version"]
+
+
+def assert_one_recorded(responses):
+    fresh = [
+        r
+        for r in responses
+        if r.status_code == 200 and "Idempotent-Replayed" not in r.headers
+    ]
+    others = [r for r in responses if r not in fresh]
+    assert len(fresh) == 1
+    assert all(
+        r.status_code == 409
+        or (r.status_code == 200 and r.json() == fresh[0].json())
+        for r in others
+    ), [(r.status_code, r.text) for r in others]
+
+
+async def recorded_trials(module, session_id):
+    engine = await module.run_store(module.SESSIONS.get, session_id)
+    return engine.total_trials
+
+
+def test_concurrent_retries_record_one_trial(workers, client):
+    (main,) = workers()
+
+    async def run():
+        async with client(main) as http:
+            session_id, sequence, version = await start_trial(http)
+            body = {"session_id": session_id, "response": sequence, "version": version}
+            responses = await asyncio.gather(
+                *(
+                    http.post("/api/submit-trial", json=body)
+                    for _ in range(CONCURRENT_SUBMITS)
+                )
+            )
+            assert_one_recorded(responses)
+            assert sum("Idempotent-Replayed" in r.headers for r in responses) == (
+                CONCURRENT_SUBMITS - 1
+            )
+            assert await recorded_trials(main, session_id) == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_distinct_keys_record_one_trial(workers, client):
+    (main,) = workers()
+
+    async def run():
+        async with client(main) as http:
+            session_id, sequence, version = await start_trial(http)
+            body = {"session_id": session_id, "response": sequence, "version": version}
+            responses = await asyncio.gather(
+                *(
+                    http.post(
+                        "/api/submit-trial",
+                        json=body,
+                        headers={"Idempotency-Key": f"key-{i}"},
+                    )
+                    for i in range(CONCURRENT_SUBMITS)
+                )
+            )
+            assert_one_recorded(responses)
+            assert sum(r.status_code == 409 for r in responses) == (
+                CONCURRENT_SUBMITS - 1
+            )
+            assert await recorded_trials(main, session_id) == 1
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", ["sqlite"], indirect=True)
+def test_concurrent_workers_record_one_trial(workers, client):
+    """Workers don't share locks or reply caches; the store's CAS put decides."""
+    first, second = workers(2)
+
+    async def run():
+        async with client(first) as http_a, client(second) as http_b:
+            session_id, sequence, version = await start_trial(http_a)
+            body = {"session_id": session_id, "response": sequence, "version": version}
+            responses = await asyncio.gather(
+                *(
+                    (http_a, http_b)[i % 2].post("/api/submit-trial", json=body)
+                    for i in range(CONCURRENT_SUBMITS)
+                )
+            )
+            assert_one_recorded(responses)
+            assert await recorded_trials(first, session_id) == 1
+
+    asyncio.run(run())
+
+
+def test_different_answers_to_one_version(workers, client):
+    (main,) = workers()
+
+    async def run():
+        async with client(main) as http:
+            session_id, sequence, version = await start_trial(http)
+            body = {"session_id": session_id, "response": sequence, "version": version}
+            wrong = dict(body, response=sequence[:1])
+            assert (await http.post("/api/submit-trial", json=body)).status_code == 200
+            # A double tap without a key conflicts with the graded answer...
+            again = await http.post("/api/submit-trial", json=wrong)
+            assert again.status_code == 409
+            # ...while reusing a real key for a different trial is a client bug
+            keyed = {"Idempotency-Key": "trial-1"}
+            issued = (await http.get(f"/api/sequence/{session_id}")).json()
+            body = dict(body, response=issued["sequence"], version=issued["version"])
+            first = await http.post("/api/submit-trial", json=body, headers=keyed)
+            assert first.status_code == 200
+            wrong = dict(body, response=issued["sequence"][:1])
+            reused = await http.post("/api/submit-trial", json=wrong, headers=keyed)
+            assert reused.status_code == 422
+            assert await recorded_trials(main, session_id) == 2
+
+    asyncio.run(run())
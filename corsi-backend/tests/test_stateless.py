@@ -0,0 +1,96 @@
+"""
+A session run entirely through the stateless token endpoints, from start
+to stored summary.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from corsi_engine import CorsiEngine
+from state_token import InvalidToken, StateTokenCodec
+
+
+async def run_stateless_session(http):
+    """Answer every sequence correctly; returns the final token and reply."""
+    token = (
+        await http.post(
+            "/api/stateless/start-session",
+            json={
+                "examiner_name": "Examiner",
+                "candidate_name": "Candidate",
+                "candidate_id": "C-001",
+            },
+        )
+    ).json()["token"]
+    while True:
+        issued = (
+            await http.get("/api/stateless/sequence", headers={"X-Corsi-State": token})
+        ).json()
+        token = issued["token"]
+        reply = await http.post(
+            "/api/stateless/submit-trial",
+            json={"response": issued["sequence"]},
+            headers={"X-Corsi-State": token},
+        )
+        assert reply.status_code == 200, reply.text
+        if reply.json()["summary"] is not None:
+            return token, reply.json()
+        token = reply.json()["token"]
+
+
+def test_stateless_session_stores_summary_without_trials(workers, client, tmp_path):
+    (main,) = workers()
+
+    async def run():
+        async with main.lifespan(main.app), client(main) as http:
+            token, finished = await run_stateless_session(http)
+            # Replaying the last trial grades it again but stores nothing new
+            again = await http.post(
+                "/api/stateless/submit-trial",
+                json={"response": []},
+                headers={"X-Corsi-State": token},
+            )
+            assert again.status_code == 200
+            return finished
+
+    finished = asyncio.run(run())
+    spans = main.CorsiEngine.MAX_SPAN - main.CorsiEngine.MIN_SPAN + 1
+    total = spans * main.CorsiEngine.TRIALS_PER_SPAN
+    assert finished["summary"]["total_trials"] == total
+    assert finished["summary"]["corsi_span"] == main.CorsiEngine.MAX_SPAN
+
+    conn = sqlite3.connect(tmp_path / "candidates_database.db")
+    sessions = conn.execute(
+        "SELECT total_trials, correct_trials FROM test_sessions"
+    ).fetchall()
+    assert sessions == [(total, total)]
+    # The token carries tallies, not trials: a partial log must not be
+    # stored as if it were the whole session
+    assert conn.execute("SELECT COUNT(*) FROM trials").fetchone() == (0,)
+    conn.close()
+
+
+def test_token_round_trip_mid_session():
+    tokens = StateTokenCodec(b"secret")
+    engine = CorsiEngine({"candidate_id": "C-001"}, None)
+    for _ in range(3):
+        sequence = engine.new_sequence()
+        engine.submit_trial(sequence[::-1] if engine.current_trial == 2 else sequence)
+    pending = engine.new_sequence()
+
+    decoded = tokens.decode(tokens.encode(engine), None)
+    assert decoded._state() == engine._state()
+    assert decoded.span_attempts == engine.span_attempts
+    assert decoded.span_correct == engine.span_correct
+    assert (decoded.total_trials, decoded.correct_trials) == (3, 2)
+    assert decoded.session_key == engine.session_key
+    # The pending sequence is regenerated from the seed, not stored
+    assert decoded.submit_trial(pending)["correct"]
+
+    with pytest.raises(InvalidToken):
+        StateTokenCodec(b"other secret").decode(tokens.encode(engine), None)
+    with pytest.raises(InvalidToken):
+        StateTokenCodec(b"secret", ttl=-1).decode(
+            StateTokenCodec(b"secret", ttl=-1).encode(engine), None
+        )
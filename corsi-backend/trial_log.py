@@ -0,0 +1,197 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import struct
+import time
+
+# to_bytes() header: trial count, tap count, tap latency count
+_HEADER = struct.Struct("<III")
+
+
+def pack_latencies(latencies: Sequence[int]) -> Optional[bytes]:
+    """Encode tap latencies for the trials table; None if there are none."""
+    if not latencies:
+        return None
+    return struct.pack(f"<{len(latencies)}I", *latencies)
+
+
+def unpack_latencies(data: Optional[bytes]) -> Optional[List[int]]:
+    if data is None:
+        return None
+    return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+
+class TrialLog:
+    """
+    Compact append-only store for the trials of one session.
+
+    Records are kept as parallel arrays (struct-of-arrays) and every tap is
+    stored as a single byte, so a trial costs a few dozen bytes instead of a
+    dict with two lists and a timestamp string. Indexing and iteration still
+    yield the same dicts CorsiEngine used to keep in ``results``.
+    """
+
+    __slots__ = (
+        "spans",
+        "trial_numbers",
+        "correct",
+        "timestamps",
+        "taps",
+        "offsets",
+        "latencies",
+        "latency_offsets",
+    )
+
+    def __init__(self):
+        self.spans = bytearray()
+        self.trial_numbers = array("H")
+        self.correct = bytearray()
+        self.timestamps = array("q")  # wall-clock nanoseconds since the epoch
+        # Taps of all trials back to back; trial i owns two slices:
+        # sequence = taps[offsets[2i]:offsets[2i+1]],
+        # response = taps[offsets[2i+1]:offsets[2i+2]]
+        self.taps = bytearray()
+        self.offsets = array("I", [0])
+        # Milliseconds before each response tap, for trials answered tap by
+        # tap; trial i owns latencies[latency_offsets[i]:latency_offsets[i+1]]
+        self.latencies = array("I")
+        self.latency_offsets = array("I", [0])
+
+    def append(
+        self,
+        span_length: int,
+        trial_number: int,
+        sequence: List[int],
+        response: List[int],
+        correct: bool,
+        timestamp_ns: Optional[int] = None,
+        tap_latencies_ms: Sequence[int] = (),
+    ) -> None:
+        """
+        Record one trial, timestamped now unless timestamp_ns says when it
+        happened. tap_latencies_ms holds one latency per response tap when
+        they were submitted one at a time. Raises ValueError for taps
+        outside 0-255.
+        """
+        seq = bytes(sequence)
+        resp = bytes(response)
+
+        self.spans.append(span_length)
+        self.trial_numbers.append(trial_number)
+        self.correct.append(1 if correct else 0)
+        self.timestamps.append(time.time_ns() if timestamp_ns is None else timestamp_ns)
+        self.taps += seq
+        self.offsets.append(self.offsets[-1] + len(seq))
+        self.taps += resp
+        self.offsets.append(self.offsets[-1] + len(resp))
+        self.latencies.extend(tap_latencies_ms)
+        self.latency_offsets.append(len(self.latencies))
+
+    def to_bytes(self) -> bytes:
+        """Serialize the log; arrays are written in native byte order."""
+        return b"".join(
+            (
+                _HEADER.pack(len(self), len(self.taps), len(self.latencies)),
+                self.spans,
+                self.trial_numbers.tobytes(),
+                self.correct,
+                self.timestamps.tobytes(),
+                self.offsets.tobytes(),
+                self.taps,
+                self.latency_offsets.tobytes(),
+                self.latencies.tobytes(),
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TrialLog":
+        """Rebuild a log written by to_bytes()."""
+        count, tap_count, latency_count = _HEADER.unpack_from(data)
+        log = cls()
+        view = memoryview(data)[_HEADER.size :]
+
+        def take(size: int) -> memoryview:
+            nonlocal view
+            chunk, view = view[:size], view[size:]
+            return chunk
+
+        log.spans = bytearray(take(count))
+        log.trial_numbers.frombytes(take(count * log.trial_numbers.itemsize))
+        log.correct = bytearray(take(count))
+        log.timestamps.frombytes(take(count * log.timestamps.itemsize))
+        log.offsets = array("I")
+        log.offsets.frombytes(take((2 * count + 1) * log.offsets.itemsize))
+        log.taps = bytearray(take(tap_count))
+        log.latency_offsets = array("I")
+        log.latency_offsets.frombytes(take((count + 1) * log.latency_offsets.itemsize))
+        log.latencies.frombytes(take(latency_count * log.latencies.itemsize))
+        return log
+
+    def rows(self) -> List[Tuple]:
+        """
+        Trials as (trial_index, span_length, trial_number, sequence, response,
+        correct, timestamp_ns, tap_latencies_ms) rows for the trials table.
+        Taps are bytes; latencies are little-endian uint32s, or None for
+        trials submitted as a whole response.
+        """
+        offsets = self.offsets
+        return [
+            (
+                i,
+                self.spans[i],
+                self.trial_numbers[i],
+                bytes(self.taps[offsets[2 * i] : offsets[2 * i + 1]]),
+                bytes(self.taps[offsets[2 * i + 1] : offsets[2 * i + 2]]),
+                self.correct[i],
+                self.timestamps[i],
+                pack_latencies(self.tap_latencies(i)),
+            )
+            for i in range(len(self))
+        ]
+
+    def tap_latencies(self, index: int) -> List[int]:
+        """Per-tap latencies of a trial; empty unless it was answered tap by tap."""
+        return self.latencies[
+            self.latency_offsets[index] : self.latency_offsets[index + 1]
+        ].tolist()
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trial index out of range")
+
+        start, middle, end = self.offsets[2 * index : 2 * index + 3]
+        timestamp = datetime.fromtimestamp(self.timestamps[index] / 1e9)
+        return {
+            "span_length": self.spans[index],
+            "trial_number": self.trial_numbers[index],
+            "sequence": list(self.taps[start:middle]),
+            "response": list(self.taps[middle:end]),
+            "correct": bool(self.correct[index]),
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "tap_latencies_ms": self.tap_latencies(index),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __sizeof__(self) -> int:
+        """Approximate footprint, including the underlying buffers."""
+        return object.__sizeof__(self) + sum(
+            buf.__sizeof__()
+            for buf in (
+                self.spans,
+                self.trial_numbers,
+                self.correct,
+                self.timestamps,
+                self.taps,
+                self.offsets,
+                self.latencies,
+                self.latency_offsets,
+            )
+        )
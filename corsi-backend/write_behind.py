@@ -0,0 +1,108 @@
+import queue
+import threading
+from typing import Dict, Sequence, Tuple
+
+from database_manager import DatabaseManager
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Persists finished sessions on a background thread.
+
+    save_session_record() has the same signature as DatabaseManager's but
+    only enqueues the record, so engines can use either one. The writer
+    thread drains up to batch_size records at a time and commits each batch
+    in a single transaction. When the queue is full, callers wait up to
+    put_timeout seconds and then write the record themselves, so a stalled
+    writer slows requests down instead of losing data.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        max_size: int = 1000,
+        batch_size: int = 100,
+        put_timeout: float = 5.0,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._thread = threading.Thread(
+            target=self._run, name="corsi-write-behind", daemon=True
+        )
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.direct_writes = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def save_session_record(
+        self, candidate_info: Dict, session_data: Dict, trials: Sequence[Tuple] = ()
+    ) -> bool:
+        record = (candidate_info, session_data, trials)
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self.direct_writes += 1
+            return self.db.save_session_record(*record)
+        self.enqueued += 1
+        return True
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Group-commit whatever else is already waiting
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in batch:
+                stopping = True
+                # Drain records queued after the stop request was issued
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch) -> None:
+        if self.db.save_session_records(batch):
+            self.batches += 1
+            self.written += len(batch)
+            return
+
+        # Retry one by one so a single bad record doesn't sink the batch
+        for record in batch:
+            if self.db.save_session_record(*record):
+                self.written += 1
+            else:
+                self.failures += 1
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "direct_writes": self.direct_writes,
+        }
@@ -1,6 +1,7 @@
 import React, { useState } from "react";
 import CandidateForm from "./CandidateForm";
 import CorsiBoard from "./CorsiBoard";
+import { OfflineSession } from "./offlineSession";
 import "./corsi.css";
 
 // URL should be injected using Environment
@@ -11,6 +12,7 @@ function App() {
   const [candidate, setCandidate] = useState(null);
   const [sessionId, setSessionId] = useState(null);
   const [initialState, setInitialState] = useState(null);
+  const [offlineSession, setOfflineSession] = useState(null);
   const [dbStats, setDbStats] = useState(null);
 
   const handleDetailsSaved = (details) => {
@@ -37,6 +39,7 @@ function App() {
       }
       const data = await res.json();
       setSessionId(data.session_id);
+      setOfflineSession(null);
       setInitialState(data.state);
       setView("task");
     } catch (err) {
@@ -45,6 +48,35 @@ function App() {
     }
   };
 
+  // Offline mode: one request to get a seed, one to upload the whole session
+  const handleStartOfflineTask = async () => {
+    if (!candidate) {
+      alert("Please enter candidate details first.");
+      setView("details");
+      return;
+    }
+
+    try {
+      const res = await fetch(`${API_BASE}/offline/start-session`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(candidate),
+      });
+      if (!res.ok) {
+        alert("Error starting offline session");
+        return;
+      }
+      const data = await res.json();
+      setSessionId(null);
+      setOfflineSession(new OfflineSession(data));
+      setInitialState(data.state);
+      setView("task");
+    } catch (err) {
+      console.error(err);
+      alert("Network error starting offline session");
+    }
+  };
+
   const handleViewDb = async () => {
     try {
       const res = await fetch(`${API_BASE}/stats`);
@@ -64,6 +96,7 @@ function App() {
   const handleExit = () => {
     setCandidate(null);
     setSessionId(null);
+    setOfflineSession(null);
     setInitialState(null);
     setDbStats(null);
     setView("details");
@@ -86,6 +119,9 @@ function App() {
 
       <div className="menu-options">
         <button onClick={handleStartTask}>Start Corsi Task</button>
+        <button onClick={handleStartOfflineTask}>
+          Start Corsi Task (Offline)
+        </button>
         <button onClick={() => setView("details")}>Edit Candidate Details</button>
         <button onClick={handleViewDb}>View Database Status</button>
         <button onClick={() => setView("instructions")}>View Instructions</button>
@@ -157,10 +193,11 @@ function App() {
       {view === "instructions" && renderInstructions()}
       {view === "db" && renderDbStatus()}
 
-      {view === "task" && sessionId && initialState && (
+      {view === "task" && (sessionId || offlineSession) && initialState && (
         <CorsiBoard
           sessionId={sessionId}
           initialState={initialState}
+          offlineSession={offlineSession}
           onFinished={() => setView("menu")}
         />
       )}
@@ -42,9 +42,15 @@ function generatePositions() {
   return positions;
 }
 
-export default function CorsiBoard({ sessionId, initialState, onFinished }) {
+export default function CorsiBoard({
+  sessionId,
+  initialState,
+  offlineSession,
+  onFinished,
+}) {
   const [state, setState] = useState(initialState);
   const [sequence, setSequence] = useState([]);
+  const [version, setVersion] = useState(null); // nonce of the issued sequence
   const [positions, setPositions] = useState(generatePositions()); // index = blockId
   const [activeBlockId, setActiveBlockId] = useState(null);
   const [userInput, setUserInput] = useState([]);
@@ -52,12 +58,19 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
   const [isPlaying, setIsPlaying] = useState(false);
   const [finished, setFinished] = useState(false);
   const [summary, setSummary] = useState(null);
+  const [uploadFailed, setUploadFailed] = useState(false);
 
   // Load a new sequence AND reposition blocks
   const loadSequence = async () => {
     setStatus("Loading sequence...");
     setUserInput([]);
 
+    if (offlineSession) {
+      const data = offlineSession.newSequence();
+      startRound(data.sequence, data.version, data.state);
+      return;
+    }
+
     try {
       const res = await fetch(`${API_BASE}/sequence/${sessionId}`);
       if (!res.ok) {
@@ -66,19 +79,26 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
       }
 
       const data = await res.json();
-
-      // New random positions for this round (blocks move)
-      setPositions(generatePositions());
-
-      setSequence(data.sequence);
-      setState(data.state);
-      playSequence(data.sequence, data.state);
+      startRound(data.sequence, data.version, data.state);
     } catch (err) {
       console.error(err);
       setStatus("Network error while loading sequence");
     }
   };
 
+  // Show a sequence that has already been issued by the backend
+  const startRound = (seq, seqVersion, newState) => {
+    setUserInput([]);
+
+    // New random positions for this round (blocks move)
+    setPositions(generatePositions());
+
+    setSequence(seq);
+    setVersion(seqVersion);
+    setState(newState);
+    playSequence(seq, newState);
+  };
+
   // Playback: highlight blocks in order
   const playSequence = (seq, newState) => {
     setIsPlaying(true);
@@ -116,6 +136,11 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
 
   // Submit trial to backend
   const submitTrial = async (response) => {
+    if (offlineSession) {
+      submitOfflineTrial(response);
+      return;
+    }
+
     setStatus("Checking response...");
 
     try {
@@ -124,8 +149,9 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           session_id: sessionId,
-          sequence,
           response,
+          version,
+          include_next: true,
         }),
       });
 
@@ -135,34 +161,102 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
       }
 
       const data = await res.json();
-      const { trial_result, summary } = data;
+      handleTrialResult(
+        data.trial_result,
+        data.summary,
+        data.next_sequence,
+        data.next_version
+      );
+    } catch (err) {
+      console.error(err);
+      setStatus("Network error submitting trial");
+    }
+  };
 
-      if (trial_result.correct) {
-        setStatus("✓ Correct!");
-      } else {
-        setStatus("✗ Incorrect");
+  // Offline sessions are scored locally and uploaded in one request at the end
+  const submitOfflineTrial = (response) => {
+    const trialResult = offlineSession.submitTrial(response);
+    if (trialResult.finished) {
+      handleTrialResult(trialResult, null);
+      uploadOfflineSession();
+      return;
+    }
+    const next = offlineSession.newSequence();
+    handleTrialResult(trialResult, null, next.sequence, next.version);
+  };
+
+  const uploadOfflineSession = async () => {
+    setUploadFailed(false);
+    setStatus("Uploading session...");
+
+    try {
+      const res = await fetch(`${API_BASE}/offline/upload`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(offlineSession.uploadPayload()),
+      });
+
+      if (!res.ok) {
+        setStatus("Error uploading session");
+        setUploadFailed(res.status >= 500);
+        return;
       }
 
-      if (trial_result.finished) {
-        setFinished(true);
-        if (summary) {
-          setSummary(summary);
-          setStatus(
-            `Task finished. Corsi span: ${summary.corsi_span}, Accuracy: ${summary.accuracy.toFixed(
-              1
-            )}%`
-          );
-        }
-        if (onFinished) {
-          setTimeout(onFinished, 1500);
-        }
-      } else {
-        setState(trial_result.next_state);
-        setTimeout(loadSequence, 1200);
+      const data = await res.json();
+      showSummary(data.summary);
+      if (onFinished) {
+        setTimeout(onFinished, 1500);
       }
     } catch (err) {
       console.error(err);
-      setStatus("Network error submitting trial");
+      setStatus("Network error uploading session. Retry when back online.");
+      setUploadFailed(true);
+    }
+  };
+
+  const showSummary = (summary) => {
+    setSummary(summary);
+    setStatus(
+      `Task finished. Corsi span: ${summary.corsi_span}, Accuracy: ${summary.accuracy.toFixed(
+        1
+      )}%`
+    );
+  };
+
+  const handleTrialResult = (
+    trial_result,
+    summary,
+    next_sequence,
+    next_version
+  ) => {
+    if (trial_result.correct) {
+      setStatus("✓ Correct!");
+    } else {
+      setStatus("✗ Incorrect");
+    }
+
+    if (trial_result.finished) {
+      setFinished(true);
+      if (offlineSession) {
+        return;
+      }
+      if (summary) {
+        showSummary(summary);
+      }
+      if (onFinished) {
+        setTimeout(onFinished, 1500);
+      }
+    } else {
+      setState(trial_result.next_state);
+      if (next_sequence) {
+        setTimeout(
+          () =>
+            startRound(next_sequence, next_version, trial_result.next_state),
+          1200
+        );
+      } else {
+        setTimeout(loadSequence, 1200);
+      }
     }
   };
 
@@ -217,6 +311,12 @@ export default function CorsiBoard({ sessionId, initialState, onFinished }) {
         </button>
       )}
 
+      {finished && uploadFailed && (
+        <button className="control-btn" onClick={uploadOfflineSession}>
+          Retry Upload
+        </button>
+      )}
+
       {finished && summary && (
         <div className="summary-card">
           <h3>Session Summary</h3>
@@ -0,0 +1,94 @@
+// Runs a whole Corsi session in the browser from a server-issued seed.
+// Sequence generation and progression rules mirror corsi_engine.py so the
+// backend can replay the uploaded trials and get the same result.
+
+// mulberry32 + partial Fisher-Yates, identical to seeded_sequence() in
+// corsi_engine.py
+export function seededSequence(seed, index, span, numBlocks) {
+  let state = (seed ^ Math.imul(index, 0x9e3779b9)) >>> 0;
+  const blocks = Array.from({ length: numBlocks }, (_, i) => i);
+
+  for (let i = 0; i < span; i++) {
+    state = (state + 0x6d2b79f5) >>> 0;
+    let t = Math.imul(state ^ (state >>> 15), state | 1) >>> 0;
+    t = (((t + Math.imul(t ^ (t >>> 7), t | 61)) >>> 0) ^ t) >>> 0;
+    const j = i + (((t ^ (t >>> 14)) >>> 0) % (numBlocks - i));
+    [blocks[i], blocks[j]] = [blocks[j], blocks[i]];
+  }
+  return blocks.slice(0, span);
+}
+
+export class OfflineSession {
+  constructor({ ticket, seed, protocol }) {
+    this.ticket = ticket;
+    this.seed = seed;
+    this.protocol = protocol;
+
+    this.currentSpan = protocol.min_span;
+    this.currentTrial = 1;
+    this.finished = false;
+    this.sequencesIssued = 0;
+    this.pending = null; // sequence waiting for a response
+    this.spanAttempts = 0;
+    this.spanCorrect = 0;
+    this.trials = []; // { version, response, timestamp_ms } in answer order
+  }
+
+  state() {
+    return {
+      span_length: this.currentSpan,
+      trial_number: this.currentTrial,
+      finished: this.finished,
+    };
+  }
+
+  newSequence() {
+    const sequence = seededSequence(
+      this.seed,
+      this.sequencesIssued,
+      this.currentSpan,
+      this.protocol.num_blocks
+    );
+    this.sequencesIssued += 1;
+    this.pending = sequence;
+    return { sequence, version: this.sequencesIssued, state: this.state() };
+  }
+
+  submitTrial(response) {
+    const sequence = this.pending;
+    const correct =
+      sequence.length === response.length &&
+      sequence.every((block, i) => block === response[i]);
+    this.pending = null;
+    this.trials.push({
+      version: this.sequencesIssued,
+      response,
+      timestamp_ms: Date.now(),
+    });
+
+    this.spanAttempts += 1;
+    this.spanCorrect += correct ? 1 : 0;
+
+    if (this.spanAttempts >= this.protocol.trials_per_span) {
+      // Discontinue rule: every trial at this span failed
+      if (this.spanCorrect === 0) {
+        this.finished = true;
+      } else if (this.currentSpan < this.protocol.max_span) {
+        this.currentSpan += 1;
+      } else {
+        this.finished = true;
+      }
+      this.currentTrial = 1;
+      this.spanAttempts = 0;
+      this.spanCorrect = 0;
+    } else {
+      this.currentTrial += 1;
+    }
+
+    return { correct, finished: this.finished, next_state: this.state() };
+  }
+
+  uploadPayload() {
+    return { ticket: this.ticket, trials: this.trials };
+  }
+}